@@ -1,18 +1,28 @@
 import os
+import json
 import sqlite3
 import random
 import string
 import time
-from flask import Flask, request, render_template, redirect, url_for, flash, send_from_directory, session
-from werkzeug.utils import secure_filename
+import logging
+import threading
+from flask import (Flask, request, render_template, redirect, url_for, flash, send_from_directory, session, jsonify,
+                   Response)
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from dotenv import load_dotenv
-from utils.checker import generate_pdf_report, tokenize_code, get_graphcodebert_embedding, compute_similarity_pair
-import torch
-from transformers import AutoTokenizer, AutoModel
+from utils.embedding_cache import EmbeddingCache, content_hash, embedding_namespace
+from utils.vector_index import VectorIndex
+from utils.jobs import JobQueue, new_job_id, create_jobs_table
+from utils.assignments import create_assignment_tables, recheck_assignment, ASSIGNMENT_MODES
+from utils.ingest import Ingest, IngestError, is_archive, iter_files
+from utils.report_cache import ReportCache, report_key, artifact_filename, create_report_artifacts_table
+from utils.checker import (generate_pdf_report, tokenize_code, compare_files, preload_model, get_model,
+                           DEFAULT_BACKEND, SIMILARITY_THRESHOLD)
+from utils import metrics, db
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+import shutil
 import tempfile
 import smtplib
 from email.mime.text import MIMEText
@@ -21,38 +31,121 @@ app = Flask(__name__)
 app.secret_key = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
 load_dotenv()
 
+logging.basicConfig(level=os.getenv('CODESIM_LOG_LEVEL', 'INFO'),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
 # Configuration
 UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'codecompare_uploads')
 REPORT_FOLDER = os.path.join(tempfile.gettempdir(), 'codecompare_reports')
+DATABASE = 'database.db'
 ALLOWED_EXTENSIONS = {'py', 'java', 'cpp', 'c', 'js', 'php'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['REPORT_FOLDER'] = REPORT_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Ensure directories exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(REPORT_FOLDER, exist_ok=True)
+app.config['CHUNKED_EMBEDDINGS'] = True  # cover files longer than 512 tokens with sliding windows
+app.config['HISTORY_INDEX_FOLDER'] = 'history_index'  # past submissions, one index per file type
+app.config['HISTORY_TOP_K'] = 3
+app.config['SIMILARITY_MODE'] = os.getenv('CODESIM_SIMILARITY_MODE', 'neural')  # neural, hybrid, fingerprint or function
+app.config['PROFILE_JOBS'] = os.getenv('CODESIM_PROFILE_JOBS') == '1'  # store a cProfile summary with every report
+app.config['REPORT_CACHE_MAX_BYTES'] = int(os.getenv('CODESIM_REPORT_CACHE_MAX_BYTES', 1024**3))
+app.config['REPORT_CACHE_MAX_AGE'] = int(os.getenv('CODESIM_REPORT_CACHE_MAX_AGE', 7 * 24 * 3600))  # seconds since last use
+app.config['JOB_RETENTION'] = int(os.getenv('CODESIM_JOB_RETENTION', 7 * 24 * 3600))  # seconds a finished job (and its result) is kept
+
+# Built by init_app(); importing this module has no side effects, because
+# highlight pool workers (spawned) re-import it as __mp_main__
+embedding_cache = None  # embeddings persist across checks, so resubmissions only embed new files
+report_cache = None  # identical file sets with identical settings reuse the stored report
+job_queue = None
+_init_lock = threading.Lock()
+_initialized = False
 
 # SQLite Database Setup
+# Schema migrations, applied in order; step k moves PRAGMA user_version from
+# k to k + 1. Databases created before versioning are at version 0 and may
+# already hold some of these tables, hence IF NOT EXISTS. Append new steps,
+# never edit shipped ones.
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users 
+                    (id INTEGER PRIMARY KEY, 
+                     email TEXT UNIQUE, 
+                     name TEXT, 
+                     otp TEXT, 
+                     otp_expiry INTEGER,
+                     last_logout INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS reports 
+                    (id INTEGER PRIMARY KEY, 
+                     user_id INTEGER, 
+                     filename TEXT, 
+                     created_at INTEGER)''')
+
+def _add_report_timings(conn):
+    if 'timings' not in db.columns(conn, 'reports'):
+        conn.execute('ALTER TABLE reports ADD COLUMN timings TEXT')
+
+def _index_reports(conn):
+    # Dashboard history filters on user_id and sorts on created_at
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_user_created ON reports (user_id, created_at)')
+
+# The tables owned by the utils modules are created here as well, so every
+# table of the database has a migration path
+MIGRATIONS = [_create_tables, _add_report_timings, _index_reports, create_jobs_table, create_assignment_tables,
+              create_report_artifacts_table]
+
 def init_db():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users 
-                 (id INTEGER PRIMARY KEY, 
-                  email TEXT UNIQUE, 
-                  name TEXT, 
-                  otp TEXT, 
-                  otp_expiry INTEGER,
-                  last_logout INTEGER)''')  # 👈 add this
-    c.execute('''CREATE TABLE IF NOT EXISTS reports 
-                 (id INTEGER PRIMARY KEY, 
-                  user_id INTEGER, 
-                  filename TEXT, 
-                  created_at INTEGER)''')
-    conn.commit()
-    conn.close()
+    db.migrate(DATABASE, MIGRATIONS)
+
+def init_app():
+    # Creates the folders, migrates the database and builds the caches and the
+    # job queue; idempotent. Runs from __main__, from create_app() (gunicorn
+    # 'app:create_app()', in the master with --preload) or else on the first
+    # request. With CODESIM_PRELOAD_MODEL=1 GraphCodeBERT is loaded here
+    # instead of on the first upload.
+    global embedding_cache, report_cache, job_queue, _initialized
+    with _init_lock:
+        if _initialized:
+            return app
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        os.makedirs(REPORT_FOLDER, exist_ok=True)
+        embedding_cache = EmbeddingCache('embeddings.db')
+        report_cache = ReportCache(DATABASE, REPORT_FOLDER, max_bytes=app.config['REPORT_CACHE_MAX_BYTES'],
+                                   max_age=app.config['REPORT_CACHE_MAX_AGE'])
+        init_db()
+        report_cache.adopt_existing()
+        job_queue = JobQueue(DATABASE, run_similarity_job, workers=int(os.getenv('CODESIM_JOB_WORKERS', '1')),
+                             retention=app.config['JOB_RETENTION'])
+        if os.getenv('CODESIM_PRELOAD_MODEL') == '1':
+            preload_model()
+        _initialized = True
+    return app
+
+def create_app():
+    return init_app()
+
+@app.before_request
+def _ensure_initialized():
+    if not _initialized:
+        init_app()
 
 # Helper Functions
+_history_indexes = {}
+
+def get_history_index(file_type, dim):
+    index = _history_indexes.get(file_type)
+    if index is None:
+        path = os.path.join(app.config['HISTORY_INDEX_FOLDER'], file_type)
+        index = _history_indexes.setdefault(file_type, VectorIndex(path, dim))
+    return index
+
+def history_match(match, user_id):
+    # The index is shared by all accounts; a match from another account (or
+    # an entry indexed before owners were recorded) only reveals its score
+    # and date, never the filename or report
+    date = time.strftime('%Y-%m-%d', time.localtime(match['created_at']))
+    if match.get('user_id') != user_id:
+        return {'own': False, 'score': match['score'], 'date': date}
+    return {'own': True, 'score': match['score'], 'date': date, 'filename': match['filename'], 'report': match['report']}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -82,10 +175,10 @@ def send_otp_email(email, otp):
             server.starttls()
             server.login(smtp_user, smtp_pass)
             server.sendmail(smtp_user, email, msg.as_string())
-        print(f"OTP sent to {email}")
+        logger.info("OTP sent to %s", email)
         return True
     except Exception as e:
-        print(f"Failed to send OTP: {str(e)}")
+        logger.error("Failed to send OTP: %s", e)
         return False
 
 def send_welcome_email(email, name):
@@ -118,10 +211,10 @@ def send_welcome_email(email, name):
             server.starttls()
             server.login(smtp_user, smtp_pass)
             server.sendmail(smtp_user, email, msg.as_string())
-        print(f"Welcome email sent to {email}")
+        logger.info("Welcome email sent to %s", email)
         return True
     except Exception as e:
-        print(f"Failed to send welcome email: {str(e)}")
+        logger.error("Failed to send welcome email: %s", e)
         return False
 
 
@@ -141,22 +234,17 @@ def signup():
             flash('Only @christuniversity.in email addresses are allowed.', 'error')
             return render_template('signup.html')
 
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
-
         try:
-            c.execute('INSERT INTO users (email, name) VALUES (?, ?)', (email, name))
-            conn.commit()
-
+            with db.transaction(DATABASE) as conn:
+                conn.execute('INSERT INTO users (email, name) VALUES (?, ?)', (email, name))
+        except sqlite3.IntegrityError:
+            flash('Email already registered.', 'error')
+        else:
             # ✅ Send Welcome Email
             send_welcome_email(email, name)
 
             flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
-            flash('Email already registered.', 'error')
-        finally:
-            conn.close()
 
     return render_template('signup.html')
 
@@ -172,51 +260,153 @@ def login():
             flash('Only @christuniversity.in email addresses are allowed.', 'error')
             return render_template('login.html', show_otp=False)
 
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
+        if otp:  # Verify OTP
+            # The write lock makes the check-and-clear atomic, so an OTP works once
+            with db.transaction(DATABASE, immediate=True) as conn:
+                user = conn.execute('SELECT id, otp, otp_expiry FROM users WHERE email = ?', (email,)).fetchone()
+                valid = user and user[1] == otp and user[2] > int(time.time())
+                if valid:
+                    conn.execute('UPDATE users SET otp = NULL, otp_expiry = NULL WHERE email = ?', (email,))
+            if valid:
+                session['user_id'] = user[0]
+                flash('Login successful!', 'success')
+                return redirect(url_for('dashboard'))
+            else:
+                flash('Invalid or expired OTP.', 'error')
+                return render_template('login.html', email=email, show_otp=True)
+
+        else:  # First OTP request
+            user = db.connect(DATABASE).execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
+            if user:
+                generated_otp = generate_otp()
+                expiry = int(time.time()) + 300  # 5 minutes
+                with db.transaction(DATABASE) as conn:
+                    conn.execute('UPDATE users SET otp = ?, otp_expiry = ? WHERE email = ?', (generated_otp, expiry, email))
+                logger.debug("Stored OTP %s for %s, expires at %s", generated_otp, email, expiry)
+                send_otp_email(email, generated_otp)
+                flash('OTP sent to your email.', 'info')
+                return render_template('login.html', email=email, show_otp=True)
+            else:
+                flash('Email not found. Please sign up first.', 'error')
+
+    return render_template('login.html', show_otp=False)
+
 
+def run_similarity_job(params, progress):
+    # Runs on a job worker thread, outside any request
+    with metrics.collect(profile=params.get('profile', False)) as breakdown:
+        result = _run_similarity_job(params, progress)
+
+    # Save report to database, with the timing breakdown of this run
+    with db.transaction(DATABASE) as conn:
+        conn.execute('INSERT INTO reports (user_id, filename, created_at, timings) VALUES (?, ?, ?, ?)',
+                     (params['user_id'], result['report'], result['created_at'], json.dumps(breakdown.as_dict())))
+    return result
+
+def report_params(file_type):
+    # Everything besides the files that changes a report's content. The model
+    # enters as its embedding namespace (name, revision, backend), so a
+    # revision bump never serves reports from the old weights; fingerprint
+    # mode never loads the model and does not depend on it
+    mode, chunked = app.config['SIMILARITY_MODE'], app.config['CHUNKED_EMBEDDINGS']
+    model = None if mode == 'fingerprint' else embedding_namespace(get_model()[1], chunked)
+    return {'file_type': file_type, 'mode': mode, 'chunked': chunked, 'threshold': SIMILARITY_THRESHOLD,
+            'model': model, 'backend': DEFAULT_BACKEND, 'history_top_k': app.config['HISTORY_TOP_K']}
+
+def _run_similarity_job(params, progress):
+    job_dir = params['upload_dir']
+    file_type = params['file_type']
+    # Assignment re-checks depend on what the assignment already holds, so
+    # only plain checks are looked up by content
+    key = None if params.get('assignment') else report_key(params['files'], report_params(file_type))
+    try:
+        cached = report_cache.get(key) if key else None
+        if cached:
+            progress(0.9, 'Reusing identical report')
+            return dict(cached, created_at=int(time.time()), cached=True)
+
+        # Each distinct upload is read and decoded once, however many students submitted it
+        with metrics.stage('file_io'):
+            files = list(iter_files(params['files'], file_type, job_dir))
+
+        # Compute similarity; named assignments only score pairs involving new or changed files
+        scaled = lambda fraction, message: progress(0.9 * fraction, message)
+        if params.get('assignment'):
+            scores, file_count, files, embeddings = recheck_assignment(
+                DATABASE, params['user_id'], params['assignment'], file_type, files,
+                chunked=app.config['CHUNKED_EMBEDDINGS'], cache=embedding_cache, progress=scaled,
+                mode=app.config['SIMILARITY_MODE'])
+        else:
+            scores, embeddings = compare_files(files, file_type, mode=app.config['SIMILARITY_MODE'],
+                                               chunked=app.config['CHUNKED_EMBEDDINGS'], cache=embedding_cache,
+                                               progress=scaled)
+            file_count = len(files)
+
+        # Generate PDF; written under a temporary name so a half-built report is never served
+        progress(0.9, 'Building report')
+        report_filename = (artifact_filename(key) if key
+                           else f"report_{int(time.time())}_{params['job_id'][:8]}.pdf")
+        report_path = os.path.join(app.config['REPORT_FOLDER'], report_filename)
+        partial_path = f"{report_path}.{params['job_id'][:8]}.partial"
         try:
-            if otp:  # Verify OTP
-                c.execute('SELECT id, otp, otp_expiry FROM users WHERE email = ?', (email,))
-                user = c.fetchone()
-                if user and user[1] == otp and user[2] > int(time.time()):
-                    session['user_id'] = user[0]
-                    c.execute('UPDATE users SET otp = NULL, otp_expiry = NULL WHERE email = ?', (email,))
-                    conn.commit()
-                    flash('Login successful!', 'success')
-                    return redirect(url_for('dashboard'))
-                else:
-                    flash('Invalid or expired OTP.', 'error')
-                    return render_template('login.html', email=email, show_otp=True)
-
-            else:  # First OTP request
-                c.execute('SELECT id FROM users WHERE email = ?', (email,))
-                user = c.fetchone()
-                if user:
-                    generated_otp = generate_otp()
-                    expiry = int(time.time()) + 300  # 5 minutes
-                    c.execute('UPDATE users SET otp = ?, otp_expiry = ? WHERE email = ?', (generated_otp, expiry, email))
-                    print(f"[DEBUG] Stored OTP {generated_otp} for {email}, expires at {expiry}")
-                    conn.commit()
-                    send_otp_email(email, generated_otp)
-                    flash('OTP sent to your email.', 'info')
-                    return render_template('login.html', email=email, show_otp=True)
-                else:
-                    flash('Email not found. Please sign up first.', 'error')
+            generate_pdf_report(scores, partial_path, file_count)
+            os.replace(partial_path, report_path)
         finally:
-            conn.close()
-
-    return render_template('login.html', show_otp=False)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        current_time = int(time.time())
 
+        # Top matches among all earlier submissions (of every account), then remember this batch
+        # (only when every file was embedded; the fingerprint modes may skip some)
+        history = []
+        if embeddings is not None and len(files):
+            with metrics.stage('history'):
+                history_index = get_history_index(file_type, embeddings.shape[1])
+                # A batch's own earlier copies (re-checks under other settings,
+                # evicted reports) would otherwise be every file's 100% match
+                hashes = [content_hash(file['content']) for file in files]
+                matches = history_index.search(embeddings, k=app.config['HISTORY_TOP_K'], exclude_keys=hashes)
+                # Stored unredacted: a cached result may be shown to another
+                # account, so history_match() runs when the page is rendered
+                history = [{'filename': file['filename'], 'matches': file_matches}
+                           for file, file_matches in zip(files, matches) if file_matches]
+                history_index.add(embeddings, hashes,
+                                  [{'filename': file['filename'], 'report': report_filename, 'created_at': current_time,
+                                    'user_id': params['user_id']} for file in files])
+
+        result = {
+            'report': report_filename,
+            'created_at': current_time,
+            'results': sorted(scores, key=lambda x: x['score'], reverse=True),
+            'history': history,
+        }
+        # Assignment reports are registered too (without a reusable result)
+        # so that history and eviction cover every artifact
+        report_cache.put(key or f"job:{params['job_id']}", report_filename, result if key else None)
+        return result
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+def get_user_job(job_id, status_only=False):
+    # status_only reads the status columns and the report name, not the stored result
+    if not job_id:
+        return None
+    job = job_queue.get_status(job_id, ('report',)) if status_only else job_queue.get(job_id)
+    if job is None or job['user_id'] != session.get('user_id'):
+        return None
+    return job
 
 @app.route('/dashboard', methods=['GET', 'POST'])
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
+    job_queue.start()
+    report_cache.start_evictor()
     
     files = []
     results = []
     latest_report = None  # Track the latest report from this session
+    history = []
     if request.method == 'POST':
         if 'files' not in request.files:
             flash('No files uploaded.', 'error')
@@ -227,95 +417,141 @@ def dashboard():
         if file_type not in ALLOWED_EXTENSIONS:
             flash('Invalid file type.', 'error')
             return redirect(request.url)
+        assignment = request.form.get('assignment', '').strip()
+        if assignment and app.config['SIMILARITY_MODE'] not in ASSIGNMENT_MODES:
+            flash(f"Assignments are not available in {app.config['SIMILARITY_MODE']} mode.", 'error')
+            return redirect(request.url)
         
-        # Save uploaded files
-        for file in uploaded_files:
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                files.append({'filename': filename, 'content': content, 'ext': file_type})
-            else:
-                flash(f'Invalid file: {file.filename if file else "None"}', 'error')
+        # Stream uploads (and the members of zip/tar archives) into a directory
+        # owned by this job, stored once per distinct content
+        job_id = new_job_id()
+        job_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+        ingest = Ingest(job_dir, file_type)
+        rejected = False
+        with metrics.stage('upload'):
+            for file in uploaded_files:
+                if file and file.filename and (is_archive(file.filename) or allowed_file(file.filename)):
+                    try:
+                        ingest.add_upload(file.stream, file.filename)
+                    except IngestError as e:
+                        flash(str(e), 'error')
+                        rejected = True
+                        break
+                else:
+                    flash(f'Invalid file: {file.filename if file else "None"}', 'error')
+        files = ingest.manifest()
+        metrics.count('uploaded_files', len(files))
+
+        # Like the CLI, an upload that failed a limit is not checked at all,
+        # rather than on whatever part of it was read before the error
+        if rejected:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            flash('The upload was not checked.', 'error')
+            return redirect(request.url)
         
         if len(files) < 2:
+            shutil.rmtree(job_dir, ignore_errors=True)
             flash('At least two files are required for comparison.', 'error')
             return redirect(request.url)
         
-        # Compute similarity
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        tokenizer = AutoTokenizer.from_pretrained("microsoft/graphcodebert-base")
-        model = AutoModel.from_pretrained("microsoft/graphcodebert-base").to(device)
-        embeddings = [get_graphcodebert_embedding(file['content'], tokenizer, model, device) for file in files]
-        
-        scores = []
-        for i in range(len(files)):
-            for j in range(i + 1, len(files)):
-                result = compute_similarity_pair(i, j, files, embeddings, file_type)
-                scores.append(result)
-        
-        # Generate PDF
-        report_filename = f"report_{int(time.time())}.pdf"
-        report_path = os.path.join(app.config['REPORT_FOLDER'], report_filename)
-        generate_pdf_report(scores, report_path, len(files))
-        
-        # Save report to database
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
-        current_time = int(time.time())
-        c.execute('INSERT INTO reports (user_id, filename, created_at) VALUES (?, ?, ?)',
-                  (session['user_id'], report_filename, current_time))
-        conn.commit()
-        conn.close()
-        
-        results = sorted(scores, key=lambda x: x['score'], reverse=True)
-        latest_report = (report_filename, current_time)  # Store latest report
+        job_queue.submit(session['user_id'], {'job_id': job_id, 'user_id': session['user_id'], 'file_type': file_type,
+                                              'upload_dir': job_dir, 'files': files,
+                                              'assignment': assignment,
+                                              'profile': app.config['PROFILE_JOBS'] or request.form.get('profile') == '1'},
+                         job_id=job_id)
+        return redirect(url_for('dashboard', job=job_id))
+
+    job = get_user_job(request.args.get('job'))
+    if job and job['status'] == 'done':
+        results = job['result']['results']
+        history = [{'filename': entry['filename'],
+                    'matches': [history_match(match, session['user_id']) for match in entry['matches']]}
+                   for entry in job['result']['history']]
+        latest_report = (job['result']['report'], job['result']['created_at'])
     
-    # Get recent reports, filter existing files
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute('SELECT filename, created_at FROM reports WHERE user_id = ? ORDER BY created_at DESC LIMIT 5',
-              (session['user_id'],))
-    reports = c.fetchall()
-    conn.close()
+    # Get recent reports that are still stored; evicted artifacts drop out of
+    # the join, so no per-row filesystem check is needed
+    reports = db.connect(DATABASE).execute('''SELECT r.filename, r.created_at FROM reports r
+                                              JOIN report_artifacts a ON a.filename = r.filename
+                                              WHERE r.user_id = ? ORDER BY r.created_at DESC LIMIT 5''',
+                                           (session['user_id'],)).fetchall()
     
-    # Filter reports to only include existing files, exclude latest if from this session
-    valid_reports = []
-    for report in reports:
-        report_path = os.path.join(app.config['REPORT_FOLDER'], report[0])
-        if os.path.exists(report_path):
-            if not latest_report or report[0] != latest_report[0]:  # Exclude latest report
-                valid_reports.append(report)
-            elif not latest_report:  # If no POST, include all valid reports
-                valid_reports.append(report)
-        else:
-            flash(f'Report {report[0]} not found on server.', 'error')
+    # Exclude the latest report, which is shown separately
+    valid_reports = [report for report in reports if not latest_report or report[0] != latest_report[0]]
     
-    return render_template('dashboard.html', results=results, latest_report=latest_report, reports=valid_reports)
+    return render_template('dashboard.html', results=results, latest_report=latest_report, reports=valid_reports,
+                           history=history, job=job, assignments=app.config['SIMILARITY_MODE'] in ASSIGNMENT_MODES)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    job = get_user_job(job_id, status_only=True)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    status = {key: job[key] for key in ('id', 'status', 'progress', 'message', 'error')}
+    if job['status'] == 'done':
+        status['report_url'] = url_for('download_report', filename=job['report'])
+        status['results_url'] = url_for('dashboard', job=job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if get_user_job(job_id, status_only=True) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job_queue.cancel(job_id)
+    return jsonify({'id': job_id, 'status': job_queue.get_status(job_id)['status']})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/reports/<filename>/timings')
+def report_timings(filename):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    # A cache hit adds another row for the same file; the latest one is wanted
+    row = db.connect(DATABASE).execute('''SELECT timings FROM reports WHERE user_id = ? AND filename = ?
+                                          ORDER BY created_at DESC, id DESC LIMIT 1''',
+                                       (session['user_id'], filename)).fetchone()
+    if row is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(json.loads(row[0]) if row[0] else {})
 
 @app.route('/download/<filename>')
 def download_report(filename):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    return send_from_directory(app.config['REPORT_FOLDER'], filename, as_attachment=True)
+    owned = db.connect(DATABASE).execute('SELECT 1 FROM reports WHERE user_id = ? AND filename = ? LIMIT 1',
+                                         (session['user_id'], filename)).fetchone()
+    etag = report_cache.etag(filename)
+    if owned is None or etag is None:
+        flash(f'Report {filename} not found on server.', 'error')
+        return redirect(url_for('dashboard'))
+    report_cache.touch(filename)
+    # Artifacts never change under a name, so the artifact key is a strong
+    # ETag; conditional responses also answer If-None-Match and Range
+    response = send_from_directory(app.config['REPORT_FOLDER'], filename, as_attachment=True, etag=etag,
+                                   conditional=True, max_age=24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
 @app.route('/logout')
 def logout():
     if 'user_id' in session:
         user_id = session['user_id']
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
         logout_time = int(time.time())
-        c.execute('UPDATE users SET last_logout = ? WHERE id = ?', (logout_time, user_id))
-        conn.commit()
-        conn.close()
+        with db.transaction(DATABASE) as conn:
+            conn.execute('UPDATE users SET last_logout = ? WHERE id = ?', (logout_time, user_id))
         session.pop('user_id')
         flash("Logged out successfully.", "info")
     return redirect(url_for('login'))
 
 
 if __name__ == '__main__':
-    init_db()
+    init_app()
+    preload_model()
     app.run(debug=True)
@@ -0,0 +1,145 @@
+import os
+import json
+import random
+import argparse
+
+# Synthetic classes for benchmarking. Every program is a list of functions
+# built from a small statement tree, rendered per language. A plagiarized
+# file is a copy of an earlier file with its identifiers consistently renamed
+# and its functions reordered, which is what a student hiding a copy
+# typically does.
+# Write one to disk: python -m benchmarks.corpus OUT_DIR --files 40 --language java
+
+LANGUAGES = ('py', 'java', 'c', 'cpp')
+_WORDS = ('total', 'count', 'index', 'value', 'result', 'score', 'limit', 'step', 'item', 'acc', 'width', 'depth',
+          'node', 'left', 'right', 'sum', 'delta', 'offset', 'size', 'cursor')
+
+def _name(rng, used):
+    while True:
+        name = rng.choice(_WORDS) + rng.choice(('', '_' + rng.choice(_WORDS), str(rng.randrange(100))))
+        if name not in used:
+            used.add(name)
+            return name
+
+def _expr(rng, names):
+    terms = [rng.choice(names) if rng.random() < 0.7 else str(rng.randrange(1, 100)) for _ in range(rng.randint(1, 3))]
+    return f' {rng.choice("+-*")} '.join(terms)
+
+def _block(rng, names, depth, length):
+    statements = []
+    for _ in range(length):
+        roll = rng.random()
+        if depth < 2 and roll < 0.2:
+            statements.append(('if', f'{rng.choice(names)} > {rng.randrange(100)}',
+                               _block(rng, names, depth + 1, rng.randint(1, 3))))
+        elif depth < 2 and roll < 0.35:
+            statements.append(('for', f'i{depth}', rng.randrange(2, 20), _block(rng, names, depth + 1, rng.randint(1, 3))))
+        else:
+            statements.append(('assign', rng.choice(names[2:]), _expr(rng, names)))
+    return statements
+
+def make_program(rng, functions, statements):
+    # [(name, params, locals, body, returned expression)]
+    used = set()
+    program = []
+    for _ in range(functions):
+        params = [_name(rng, used) for _ in range(2)]
+        local = [_name(rng, used) for _ in range(rng.randint(1, 3))]
+        names = params + local
+        program.append((_name(rng, used), params, local, _block(rng, names, 0, statements), _expr(rng, names)))
+    return program
+
+def _rename(node, mapping):
+    if isinstance(node, str):
+        return ' '.join(mapping.get(word, word) for word in node.split(' '))
+    if isinstance(node, (list, tuple)):
+        return type(node)(_rename(part, mapping) for part in node)
+    return node
+
+def mutate(rng, program):
+    used = set()
+    identifiers = {name for fn in program for name in [fn[0], *fn[1], *fn[2]]}
+    mapping = {name: _name(rng, used | identifiers) for name in identifiers}
+    copy = [_rename(fn, mapping) for fn in program]
+    rng.shuffle(copy)
+    return copy
+
+def _render_block(statements, language, indent):
+    pad = '    ' * indent
+    lines = []
+    for statement in statements:
+        if statement[0] == 'assign':
+            lines.append(f'{pad}{statement[1]} = {statement[2]}' + ('' if language == 'py' else ';'))
+        elif statement[0] == 'if':
+            lines.append(f'{pad}if {statement[1]}:' if language == 'py' else f'{pad}if ({statement[1]}) {{')
+            lines.extend(_render_block(statement[2], language, indent + 1))
+        else:
+            _, var, bound, body = statement
+            lines.append(f'{pad}for {var} in range({bound}):' if language == 'py'
+                         else f'{pad}for (int {var} = 0; {var} < {bound}; {var}++) {{')
+            lines.extend(_render_block(body, language, indent + 1))
+        if statement[0] != 'assign' and language != 'py':
+            lines.append(f'{pad}}}')
+    return lines
+
+def render(program, language):
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported language {language!r}")
+    indent = 1 if language == 'java' else 0
+    pad = '    ' * indent
+    lines = {'py': [], 'java': ['public class Main {'], 'c': ['#include <stdio.h>', ''],
+             'cpp': ['#include <vector>', '', 'using namespace std;', '']}[language]
+    for name, params, local, body, returned in program:
+        if language == 'py':
+            lines.append(f'def {name}({", ".join(params)}):')
+            lines.extend(f'    {var} = 0' for var in local)
+        else:
+            static = 'public static ' if language == 'java' else ''
+            lines.append(f'{pad}{static}int {name}({", ".join(f"int {p}" for p in params)}) {{')
+            lines.extend(f'{pad}    int {var} = 0;' for var in local)
+        lines.extend(_render_block(body, language, indent + 1))
+        lines.append(f'{pad}    return {returned}' + ('' if language == 'py' else ';'))
+        if language != 'py':
+            lines.append(f'{pad}}}')
+        lines.append('')
+    if language == 'java':
+        lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def make_class(files=40, functions=8, statements=6, language='py', plagiarism_rate=0.2, seed=0):
+    # Returns (files, plagiarized pairs); files are dicts like the app's uploads
+    # and each pair is (original index, copy index)
+    rng = random.Random(seed)
+    programs, pairs = [], []
+    for k in range(files):
+        if programs and rng.random() < plagiarism_rate:
+            source = rng.randrange(len(programs))
+            programs.append(mutate(rng, programs[source]))
+            pairs.append((source, k))
+        else:
+            programs.append(make_program(rng, functions, statements))
+    return [{'filename': f'student_{k:04d}.{language}', 'content': render(program, language), 'ext': language}
+            for k, program in enumerate(programs)], pairs
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic class of student submissions")
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--functions', type=int, default=8, help="Functions per file")
+    parser.add_argument('--statements', type=int, default=6, help="Top-level statements per function")
+    parser.add_argument('--language', default='py', choices=LANGUAGES)
+    parser.add_argument('--plagiarism-rate', type=float, default=0.2, help="Share of files that are mutated copies")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files, pairs = make_class(args.files, args.functions, args.statements, args.language, args.plagiarism_rate, args.seed)
+    os.makedirs(args.directory, exist_ok=True)
+    for file in files:
+        with open(os.path.join(args.directory, file['filename']), 'w', encoding='utf-8') as f:
+            f.write(file['content'])
+    with open(os.path.join(args.directory, 'plagiarized_pairs.json'), 'w') as f:
+        json.dump([[files[i]['filename'], files[j]['filename']] for i, j in pairs], f, indent=2)
+    print(f"Wrote {len(files)} files ({len(pairs)} plagiarized copies) to {args.directory}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import time
+import random
+import argparse
+from utils.checker import tokenize_code
+from utils.matcher import match_token_streams
+from utils.checker import _difflib_matches
+
+# Compares the difflib and greedy-string-tiling matchers on synthetic pairs of
+# brace-heavy Java-like files where the second file copies part of the first.
+# Run from the repository root: python -m benchmarks.matcher_bench
+
+def make_file(rng, functions):
+    lines = []
+    for f in range(functions):
+        lines.append(f"    public int method{rng.randrange(10**6)}(int a, int b) {{")
+        for _ in range(rng.randint(3, 12)):
+            lines.append(f"        if (a > {rng.randrange(100)}) {{ a = a + b * {rng.randrange(100)}; }}")
+        lines.append("        return a;")
+        lines.append("    }")
+    return "class Main {\n" + "\n".join(lines) + "\n}\n"
+
+def make_pair(rng, functions, copied=0.3):
+    original = make_file(rng, functions)
+    lines = original.split('\n')
+    cut = int(len(lines) * (1 - copied))
+    return original, make_file(rng, functions).rstrip('\n}') + '\n' + '\n'.join(lines[cut:])
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token matchers")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 80, 200], help="Functions per file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'functions':>9} {'tokens':>8} {'difflib s':>10} {'gst s':>8} {'speedup':>8} {'difflib %':>10} {'gst %':>6}")
+    for size in args.sizes:
+        code1, code2 = make_pair(rng, size)
+        tokens1, _ = tokenize_code(code1, 'java')
+        tokens2, _ = tokenize_code(code2, 'java')
+        slow, (diff1, _) = timed(_difflib_matches, tokens1, tokens2)
+        fast, (gst1, _) = timed(match_token_streams, tokens1, tokens2)
+        print(f"{size:>9} {len(tokens1) + len(tokens2):>8} {slow:>10.3f} {fast:>8.3f} {slow / max(fast, 1e-9):>7.1f}x "
+              f"{sum(diff1) / len(diff1):>10.1%} {sum(gst1) / len(gst1):>6.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import torch
+from benchmarks.corpus import LANGUAGES, make_class
+from utils.checker import (MODEL_NAME, EMBEDDING_BACKENDS, DEFAULT_BACKEND, get_model, model_stats, tokenize_code,
+                           get_graphcodebert_embedding, embed_files, similarity_matrix, compute_similarity_pair,
+                           highlight_similar_portions, highlight_pairs, generate_pdf_report)
+from utils.highlight_pool import HIGHLIGHT_WORKERS, warm_pool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Times each stage of the checker pipeline on a synthetic class and records
+# the process peak RSS after each stage (plus the Python heap peak with
+# --trace-memory, which slows the stages down). Results are written as JSON
+# and compared against a stored baseline; a stage slower than the baseline by
+# more than --tolerance is a regression and makes the run exit non-zero.
+# Offline: --tiny-model uses a small randomly initialised RoBERTa instead of
+# downloading GraphCodeBERT.
+# Run from the repository root: python -m benchmarks.pipeline_bench --tiny-model
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MIN_REGRESSION_SECONDS = 0.05  # sub-50ms stages are too noisy to flag on ratio alone
+
+def build_tiny_model(path):
+    # Character-level tokenizer and a 2-layer, 32-wide RoBERTa; the vectors
+    # are meaningless but every code path and tensor shape is exercised
+    from transformers import RobertaConfig, RobertaModel, PreTrainedTokenizerFast
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    torch.manual_seed(0)
+    vocab = {token: k for k, token in enumerate(['<s>', '<pad>', '</s>', '<unk>', '<mask>', *string.printable])}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token='<unk>'))
+    backend.pre_tokenizer = pre_tokenizers.Split('', 'isolated')
+    backend.post_processor = processors.TemplateProcessing(single='<s> $A </s>', special_tokens=[('<s>', 0), ('</s>', 2)])
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, bos_token='<s>', eos_token='</s>', pad_token='<pad>',
+                                        unk_token='<unk>', cls_token='<s>', sep_token='</s>', mask_token='<mask>')
+    config = RobertaConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                           intermediate_size=64, max_position_embeddings=520, pad_token_id=1)
+    RobertaModel(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+def measure(fn, items, repeat=1, trace_memory=False):
+    # Best of `repeat` runs
+    timings = []
+    rss_before = _peak_rss_bytes()
+    python_peak = None
+    for _ in range(repeat):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+        if trace_memory:
+            python_peak = max(python_peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    rss_after = _peak_rss_bytes()
+    seconds = min(timings)
+    return result, {
+        'seconds': seconds,
+        'items': items,
+        'items_per_second': items / seconds if seconds else None,
+        'peak_rss_bytes': rss_after,
+        'peak_rss_growth_bytes': rss_after - rss_before if rss_before is not None else None,
+        'python_peak_bytes': python_peak,
+    }
+
+def sample_pairs(n, plagiarized, max_pairs, seed):
+    # Plagiarized pairs first (they are the ones that get highlighted in
+    # practice), topped up with random other pairs
+    rng = random.Random(seed)
+    chosen = [tuple(sorted(pair)) for pair in plagiarized[:max_pairs]]
+    seen = set(chosen)
+    total = n * (n - 1) // 2
+    while len(chosen) < min(max_pairs, total):
+        i, j = sorted(rng.sample(range(n), 2))
+        if (i, j) not in seen:
+            seen.add((i, j))
+            chosen.append((i, j))
+    return chosen
+
+def run(args, model_name):
+    files, plagiarized = make_class(args.files, args.functions, args.statements, args.language,
+                                    args.plagiarism_rate, args.seed)
+    pairs = sample_pairs(len(files), plagiarized, args.max_pairs, args.seed)
+    lang = args.language
+    stages = {}
+
+    def stage(name, fn, items):
+        result, stages[name] = measure(fn, items, args.repeat, args.trace_memory)
+        print(f"{name:>28} {stages[name]['seconds']:>9.3f}s {items:>7} items", file=sys.stderr)
+        return result
+
+    tokenizer, model, device = get_model(model_name, args.backend)
+    load = model_stats(model_name, args.backend)
+    stages['load_model'] = {'seconds': load['load_seconds'], 'items': 1, 'tensor_bytes': load['tensor_bytes'],
+                            'peak_rss_bytes': _peak_rss_bytes(), 'peak_rss_growth_bytes': load['peak_rss_delta_bytes']}
+    tokens = stage('tokenize_code', lambda: [tokenize_code(file['content'], lang)[0] for file in files], len(files))
+    stage('get_graphcodebert_embedding',
+          lambda: [get_graphcodebert_embedding(file['content'], tokenizer, model, device) for file in files], len(files))
+    embeddings = stage('embed_files', lambda: embed_files([file['content'] for file in files], tokenizer, model, device,
+                                                          chunked=not args.truncate), len(files))
+    matrix = stage('similarity_matrix', lambda: similarity_matrix(embeddings), len(files) * (len(files) - 1) // 2)
+    stage('compute_similarity_pair', lambda: [compute_similarity_pair(i, j, files, embeddings, lang) for i, j in pairs],
+          len(pairs))
+    stage('highlight_similar_portions',
+          lambda: [highlight_similar_portions(files[i]['content'], files[j]['content'], lang) for i, j in pairs],
+          len(pairs))
+    stage('highlight_pool_start', lambda: warm_pool(), HIGHLIGHT_WORKERS)
+    highlights = stage('highlight_pairs', lambda: highlight_pairs(files, pairs, lang), len(pairs))
+
+    highlighted = dict(zip(pairs, highlights))
+    scores = []
+    for i in range(len(files)):
+        for j in range(i + 1, len(files)):
+            code = highlighted.get((i, j))
+            scores.append({'file1': files[i]['filename'], 'file2': files[j]['filename'], 'score': float(matrix[i, j]),
+                           'highlight': {'file1': files[i]['filename'], 'file2': files[j]['filename'],
+                                         'code1': code[0], 'code2': code[1]} if code else None})
+    with tempfile.TemporaryDirectory() as scratch:
+        report = os.path.join(scratch, 'report.pdf')
+        stage('generate_pdf_report', lambda: generate_pdf_report(scores, report, len(files)), len(scores))
+
+    return {
+        'config': {
+            'model': args.model or ('tiny' if args.tiny_model else MODEL_NAME),
+            'backend': args.backend,
+            'files': args.files,
+            'functions': args.functions,
+            'statements': args.statements,
+            'language': args.language,
+            'plagiarism_rate': args.plagiarism_rate,
+            'seed': args.seed,
+            'max_pairs': args.max_pairs,
+            'truncate': args.truncate,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'device': str(device),
+            'highlight_workers': HIGHLIGHT_WORKERS,
+        },
+        'corpus': {
+            'tokens': sum(len(stream) for stream in tokens),
+            'bytes': sum(len(file['content'].encode('utf-8')) for file in files),
+            'plagiarized_pairs': len(plagiarized),
+        },
+        'created_at': int(time.time()),
+        'stages': stages,
+    }
+
+def compare(results, baseline, tolerance):
+    # Returns the names of the stages that regressed
+    if baseline['config'] != results['config']:
+        print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+    regressions = []
+    print(f"{'stage':>28} {'baseline s':>11} {'current s':>10} {'ratio':>7}")
+    for name, stage in results['stages'].items():
+        before = baseline['stages'].get(name)
+        if not before or not before.get('seconds'):
+            continue
+        ratio = stage['seconds'] / before['seconds']
+        flag = ''
+        if ratio > 1 + tolerance and stage['seconds'] - before['seconds'] > MIN_REGRESSION_SECONDS:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:>28} {before['seconds']:>11.3f} {stage['seconds']:>10.3f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the checker pipeline on a synthetic class")
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--functions', type=int, default=8, help="Functions per file")
+    parser.add_argument('--statements', type=int, default=6, help="Top-level statements per function")
+    parser.add_argument('--language', default='py', choices=LANGUAGES)
+    parser.add_argument('--plagiarism-rate', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-pairs', type=int, default=100, help="Pairs used by the per-pair and highlighting stages")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('--truncate', action='store_true', help="Benchmark truncated instead of chunked embeddings")
+    parser.add_argument('--model', help=f"Model name or path (default {MODEL_NAME})")
+    parser.add_argument('--tiny-model', action='store_true', help="Use a tiny randomly initialised local model")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=EMBEDDING_BACKENDS)
+    parser.add_argument('--trace-memory', action='store_true', help="Also record the Python heap peak (slower)")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write the JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before a stage is a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        model_name = args.model or (build_tiny_model(os.path.join(scratch, 'tiny')) if args.tiny_model else MODEL_NAME)
+        results = run(args, model_name)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -17,8 +17,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 li.prepend(icon);
                 fileList.appendChild(li);
             });
-            analyzeBtn.disabled = files.length < 2;
-            analyzeBtn.classList.toggle('opacity-50', files.length < 2);
+            // One archive can hold a whole class
+            const hasArchive = files.some(file => /\.(zip|tar|tgz|tbz2|txz|tar\.(gz|bz2|xz))$/i.test(file.name));
+            const notEnough = files.length < 2 && !hasArchive;
+            analyzeBtn.disabled = notEnough;
+            analyzeBtn.classList.toggle('opacity-50', notEnough);
         });
 
         // Accessibility: Allow Enter key to trigger file input
@@ -29,6 +32,32 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Poll a running similarity job and reload with its results when done
+    const jobStatus = document.getElementById('job-status');
+    if (jobStatus) {
+        const message = document.getElementById('job-message');
+        const bar = document.getElementById('job-progress');
+        const poll = () => {
+            fetch(jobStatus.dataset.statusUrl)
+                .then(response => response.json())
+                .then(job => {
+                    message.textContent = job.message;
+                    bar.style.width = `${Math.round(job.progress * 100)}%`;
+                    if (job.status === 'queued' || job.status === 'running') {
+                        setTimeout(poll, 1500);
+                    } else {
+                        window.location.reload();
+                    }
+                })
+                .catch(() => setTimeout(poll, 5000));
+        };
+        setTimeout(poll, 1500);
+
+        document.getElementById('job-cancel').addEventListener('click', () => {
+            fetch(jobStatus.dataset.cancelUrl, { method: 'POST' });
+        });
+    }
+
     // Auto-highlight code with Prism.js when modal is shown
     window.showCode = function(code1, code2, file1, file2) {
         const code1Element = document.getElementById('code1');
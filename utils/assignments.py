@@ -0,0 +1,145 @@
+import json
+import time
+import numpy as np
+from utils.embedding_cache import content_hash, embedding_namespace
+from utils import metrics, db
+from utils.checker import get_model, embed_files, normalize_rows, pair_result, highlight_pairs, \
+    SIMILARITY_THRESHOLD
+
+# Assignments persist their files (content, hash, embedding) and every pair
+# score, so a re-check only embeds new or changed files and only scores the
+# rows/columns of the similarity matrix that involve them: adding k files to
+# an assignment of n costs O(k*n) instead of O(n^2).
+#
+# Stored state is one embedding per file, so only the neural mode can be
+# re-checked incrementally; other modes are rejected rather than silently
+# scored as neural.
+
+ASSIGNMENT_MODES = ('neural',)
+
+def create_assignment_tables(conn):
+    # A schema migration step, see app.MIGRATIONS
+    conn.execute('''CREATE TABLE IF NOT EXISTS assignments
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  name TEXT,
+                  file_type TEXT,
+                  namespace TEXT,
+                  created_at INTEGER,
+                  updated_at INTEGER,
+                  UNIQUE (user_id, name, file_type))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS assignment_files
+                 (id INTEGER PRIMARY KEY,
+                  assignment_id INTEGER,
+                  filename TEXT,
+                  content_hash TEXT,
+                  content TEXT,
+                  embedding BLOB,
+                  added_at INTEGER,
+                  UNIQUE (assignment_id, filename))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS assignment_pairs
+                 (assignment_id INTEGER,
+                  file1_id INTEGER,
+                  file2_id INTEGER,
+                  score REAL,
+                  highlight TEXT,
+                  PRIMARY KEY (assignment_id, file1_id, file2_id))''')
+
+def _get_or_create(conn, user_id, name, file_type, namespace):
+    now = int(time.time())
+    conn.execute('''INSERT OR IGNORE INTO assignments (user_id, name, file_type, namespace, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)''', (user_id, name, file_type, namespace, now, now))
+    return conn.execute('SELECT id, namespace FROM assignments WHERE user_id = ? AND name = ? AND file_type = ?',
+                        (user_id, name, file_type)).fetchone()
+
+def recheck_assignment(db_path, user_id, name, file_type, files, chunked=True, cache=None,
+                       threshold=SIMILARITY_THRESHOLD, progress=None, mode='neural'):
+    # Merges `files` into the assignment and returns (scores for every pair,
+    # total file count, the files that were new or changed, their embeddings).
+    # Writes go through db.transaction and report() is only called between
+    # them: it commits on the same pooled connection.
+    if mode not in ASSIGNMENT_MODES:
+        raise ValueError(f"Assignment re-checks are not supported in {mode!r} mode")
+    report = progress or (lambda fraction, message: None)
+    report(0.0, "Loading model")
+    tokenizer, model, device = get_model()
+    namespace = embedding_namespace(model, chunked)
+    now = int(time.time())
+
+    with db.transaction(db_path, immediate=True) as conn:
+        assignment_id, stored_namespace = _get_or_create(conn, user_id, name, file_type, namespace)
+        if stored_namespace != namespace:
+            # Different model or embedding mode: stored vectors are not comparable
+            conn.execute('UPDATE assignment_files SET embedding = NULL WHERE assignment_id = ?', (assignment_id,))
+            conn.execute('DELETE FROM assignment_pairs WHERE assignment_id = ?', (assignment_id,))
+            conn.execute('UPDATE assignments SET namespace = ? WHERE id = ?', (namespace, assignment_id))
+
+        stored = {filename: (file_id, digest) for file_id, filename, digest in conn.execute(
+            'SELECT id, filename, content_hash FROM assignment_files WHERE assignment_id = ?', (assignment_id,))}
+        for file in files:
+            digest = content_hash(file['content'])
+            if file['filename'] not in stored:
+                conn.execute('''INSERT INTO assignment_files (assignment_id, filename, content_hash, content, added_at)
+                                VALUES (?, ?, ?, ?, ?)''', (assignment_id, file['filename'], digest, file['content'], now))
+            elif stored[file['filename']][1] != digest:
+                file_id = stored[file['filename']][0]
+                conn.execute('''UPDATE assignment_files SET content_hash = ?, content = ?, embedding = NULL, added_at = ?
+                                WHERE id = ?''', (digest, file['content'], now, file_id))
+                conn.execute('DELETE FROM assignment_pairs WHERE assignment_id = ? AND (file1_id = ? OR file2_id = ?)',
+                             (assignment_id, file_id, file_id))
+
+        rows = conn.execute('''SELECT id, filename, content, embedding FROM assignment_files
+                               WHERE assignment_id = ? ORDER BY id''', (assignment_id,)).fetchall()
+    all_files = [{'id': file_id, 'filename': filename, 'content': content, 'ext': file_type}
+                 for file_id, filename, content, _ in rows]
+    fresh = [k for k, row in enumerate(rows) if row[3] is None]
+    embeddings = np.zeros((len(rows), model.config.hidden_size), dtype=np.float32)
+    for k, row in enumerate(rows):
+        if row[3] is not None:
+            embeddings[k] = np.frombuffer(row[3], dtype=np.float32)
+
+    report(0.1, f"Embedding {len(fresh)} new or changed files")
+    if fresh:
+        embeddings[fresh] = embed_files([all_files[k]['content'] for k in fresh], tokenizer, model, device,
+                                        chunked=chunked, cache=cache,
+                                        progress=lambda fraction, message: report(0.1 + 0.4 * fraction, message))
+        with db.transaction(db_path) as conn:
+            conn.executemany('UPDATE assignment_files SET embedding = ? WHERE id = ?',
+                             [(embeddings[k].tobytes(), all_files[k]['id']) for k in fresh])
+
+    # Only the rows of the similarity matrix for fresh files are computed;
+    # fresh-vs-fresh pairs are kept once (lower index first)
+    report(0.5, "Scoring new pairs")
+    metrics.count('files', len(rows))
+    new_pairs = []
+    with metrics.stage('scoring'):
+        normed = normalize_rows(embeddings)
+        if fresh:
+            block = normed[fresh] @ normed.T
+            fresh_set = set(fresh)
+            for r, i in enumerate(fresh):
+                for j in range(len(rows)):
+                    if j == i or (j in fresh_set and j < i):
+                        continue
+                    new_pairs.append((min(i, j), max(i, j), float(block[r, j])))
+    metrics.count('pairs', len(new_pairs))
+    hot = [(i, j) for i, j, score in new_pairs if score > threshold]
+    highlights = dict(zip(hot, highlight_pairs(all_files, hot, file_type,
+                                               lambda fraction, message: report(0.5 + 0.5 * fraction, message))))
+    pair_rows = []
+    for i, j, score in new_pairs:
+        result = pair_result(i, j, all_files, score, file_type, threshold, highlights.get((i, j)))
+        pair_rows.append((assignment_id, all_files[i]['id'], all_files[j]['id'], score,
+                          json.dumps(result['highlight']) if result['highlight'] else None))
+
+    names = {file['id']: file['filename'] for file in all_files}
+    with db.transaction(db_path, immediate=True) as conn:
+        conn.executemany('''INSERT OR REPLACE INTO assignment_pairs (assignment_id, file1_id, file2_id, score, highlight)
+                            VALUES (?, ?, ?, ?, ?)''', pair_rows)
+        conn.execute('UPDATE assignments SET updated_at = ? WHERE id = ?', (now, assignment_id))
+        scores = [{'file1': names[file1_id], 'file2': names[file2_id], 'score': score,
+                   'highlight': json.loads(highlight) if highlight else None}
+                  for file1_id, file2_id, score, highlight in conn.execute(
+                      'SELECT file1_id, file2_id, score, highlight FROM assignment_pairs WHERE assignment_id = ?',
+                      (assignment_id,))]
+    return scores, len(all_files), [all_files[k] for k in fresh], embeddings[fresh]
@@ -1,12 +1,16 @@
 import os
-import re
+import sys
+import time
+import logging
 import argparse
+import threading
+import heapq
+import itertools
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModel
 from sklearn.metrics.pairwise import cosine_similarity
 import difflib
-from joblib import Parallel, delayed
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -14,75 +18,426 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 from html import escape
 
-def tokenize_code(code, file_ext):
-    # Remove comments but preserve code structure
-    if file_ext == 'py':
-        code = re.sub(r'#.*?\n', '\n', code)
-    elif file_ext in ['c', 'cpp', 'java']:
-        code = re.sub(r'//.*?\n|/\*.*?\*/', '\n', code, flags=re.DOTALL)
-    
+if not __package__:
+    # Run as a script (python utils/checker.py): make the repo root importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lexer import lex, token_texts, token_stream
+from utils.matcher import match_token_streams, tile_flags
+from utils.highlight_pool import tile_pairs
+from utils.fingerprint import FingerprintIndex
+from utils.units import split_units, best_matches, file_scores, matched_unit_pairs
+from utils.embedding_cache import EmbeddingCache, content_hash, embedding_namespace
+from utils.ingest import Ingest, IngestError, is_archive
+from utils import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import onnxruntime
+except ImportError:  # only needed for the 'onnx' backend
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "microsoft/graphcodebert-base"
+
+# Embedding backends. 'torch' is the fp32 model as published; 'int8' applies
+# dynamic int8 quantization to its Linear layers; 'onnx' exports the model
+# once to ONNX_FOLDER and runs it on ONNX Runtime. The quantized backends run
+# on CPU and produce slightly different vectors, so they get their own
+# embedding-cache namespace; backend_drift() measures how far they move.
+EMBEDDING_BACKENDS = ('torch', 'int8', 'onnx')
+DEFAULT_BACKEND = os.getenv('CODESIM_EMBEDDING_BACKEND', 'torch')
+INFERENCE_THREADS = int(os.getenv('CODESIM_INFERENCE_THREADS', '0'))  # 0 keeps the library default
+ONNX_FOLDER = os.getenv('CODESIM_ONNX_FOLDER', 'onnx_models')
+
+# Process-wide model registry: each model is loaded once and shared by every
+# request/thread. Fast tokenizers are not safe to call concurrently, so all
+# tokenizer calls go through _tokenizer_lock.
+_model_lock = threading.Lock()
+_tokenizer_lock = threading.Lock()
+_models = {}
+_model_stats = {}
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _OnnxOutput:
+    def __init__(self, last_hidden_state):
+        self.last_hidden_state = last_hidden_state
+
+class OnnxEncoder:
+    # Stands in for the PyTorch model in _embed_padded_batch: called with
+    # input_ids/attention_mask tensors, returns an object with last_hidden_state
+    embedding_backend = 'onnx'
+
+    def __init__(self, path, config, threads=INFERENCE_THREADS):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.config = config
+        self.tensor_bytes = os.path.getsize(path)
+
+    def __call__(self, input_ids, attention_mask, **_):
+        hidden = self.session.run(['last_hidden_state'], {
+            'input_ids': input_ids.cpu().numpy().astype(np.int64),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64),
+        })[0]
+        return _OnnxOutput(torch.from_numpy(hidden))
+
+def _onnx_path(model):
+    name = (getattr(model.config, 'name_or_path', '') or type(model).__name__).strip('/').replace('/', '__')
+    revision = getattr(model.config, '_commit_hash', None) or 'local'
+    return os.path.join(ONNX_FOLDER, f"{name}@{revision}.onnx")
+
+class _HiddenStates(torch.nn.Module):
+    # Exposes only (input_ids, attention_mask) -> last_hidden_state to the exporter
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+def _export_onnx(model, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    axes = {0: 'batch', 1: 'sequence'}
+    partial = f"{path}.{os.getpid()}.tmp"
+    torch.onnx.export(_HiddenStates(model), (dummy, dummy), partial, input_names=['input_ids', 'attention_mask'],
+                      output_names=['last_hidden_state'], opset_version=17, dynamo=False,
+                      dynamic_axes={'input_ids': axes, 'attention_mask': axes, 'last_hidden_state': axes})
+    os.replace(partial, path)
+
+def _tensor_bytes(model):
+    if hasattr(model, 'tensor_bytes'):
+        return model.tensor_bytes
+    # state_dict() also covers the packed weights of quantized layers
+    total = 0
+    for value in model.state_dict().values():
+        # Quantized Linear layers store a (weight, bias) tuple
+        for tensor in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+def _load_model(model_name, backend='torch'):
+    start = time.perf_counter()
+    rss_before = _peak_rss_bytes()
+    if INFERENCE_THREADS:
+        torch.set_num_threads(INFERENCE_THREADS)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    if backend == 'torch':
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        model = model.to(device)
+    elif backend == 'int8':
+        device = torch.device('cpu')
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'onnx':
+        if onnxruntime is None:
+            raise RuntimeError("The 'onnx' embedding backend requires the onnxruntime package")
+        device = torch.device('cpu')
+        path = _onnx_path(model)
+        if not os.path.exists(path):
+            _export_onnx(model, path)
+        model = OnnxEncoder(path, model.config)
+    else:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    model.embedding_backend = backend
+    elapsed = time.perf_counter() - start
+    rss_after = _peak_rss_bytes()
+    tensor_bytes = _tensor_bytes(model)
+    _model_stats[(model_name, backend)] = {
+        'model': model_name,
+        'backend': backend,
+        'device': str(device),
+        'load_seconds': elapsed,
+        'tensor_bytes': tensor_bytes,
+        'peak_rss_delta_bytes': rss_after - rss_before if rss_before is not None else None,
+    }
+    logger.info("Loaded %s (%s) on %s in %.2fs (%.0f MiB of weights)", model_name, backend, device, elapsed,
+                tensor_bytes / 2**20)
+    return tokenizer, model, device
+
+def get_model(model_name=MODEL_NAME, backend=None):
+    key = (model_name, backend or DEFAULT_BACKEND)
+    entry = _models.get(key)
+    if entry is None:
+        with _model_lock:
+            entry = _models.get(key)
+            if entry is None:
+                with metrics.stage('model_load'):
+                    entry = _load_model(*key)
+                _models[key] = entry
+    return entry
+
+def preload_model(model_name=MODEL_NAME, backend=None):
+    get_model(model_name, backend)
+    return model_stats(model_name, backend)
+
+def model_stats(model_name=MODEL_NAME, backend=None):
+    return dict(_model_stats.get((model_name, backend or DEFAULT_BACKEND), {}))
+
+def tokenize_code(code, file_ext, normalize=False):
+    # Texts only (comments and whitespace dropped); highlighting, which needs
+    # offsets and lines, lexes full tokens with lex()
     code = code.strip()
-    # Tokenize while preserving all whitespace and symbols
-    tokens = []
-    current_token = ''
-    for char in code:
-        if char.isalnum() or char == '_':
-            current_token += char
-        else:
-            if current_token:
-                tokens.append(current_token)
-                current_token = ''
-            tokens.append(char)
-    if current_token:
-        tokens.append(current_token)
-    return tokens, code
+    return token_stream(code, file_ext, normalize), code
+
+def _embed_padded_batch(batch_ids, tokenizer, model, device):
+    with _tokenizer_lock:
+        inputs = tokenizer.pad({'input_ids': batch_ids}, return_tensors="pt")
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    metrics.count('tokens', int(inputs['attention_mask'].sum()))
+    with torch.inference_mode():
+        hidden = model(**inputs).last_hidden_state
+    # Mean over real tokens only, so padding does not change a file's vector
+    mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return pooled.float().cpu().numpy()
+
+def get_graphcodebert_embeddings(codes, tokenizer, model, device, batch_size=16, max_length=512):
+    codes = list(codes)
+    embeddings = np.empty((len(codes), model.config.hidden_size), dtype=np.float32)
+    if not codes:
+        return embeddings
+    with _tokenizer_lock:
+        encoded = tokenizer(codes, truncation=True, max_length=max_length)['input_ids']
+    # Bucket by length so each batch is padded only to its own longest item
+    order = sorted(range(len(encoded)), key=lambda k: len(encoded[k]))
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        embeddings[bucket] = _embed_padded_batch([encoded[k] for k in bucket], tokenizer, model, device)
+    return embeddings
+
+def _iter_windows(ids, window, stride):
+    start = 0
+    while True:
+        yield start, ids[start:start + window]
+        if start + window >= len(ids):
+            break
+        start += stride
+
+def get_chunked_embeddings(codes, tokenizer, model, device, batch_size=16, max_length=512, stride=384, keep_chunks=True):
+    # Files longer than one window are split into overlapping windows; the file
+    # vector is the token-weighted mean of its window vectors. Only one batch of
+    # windows is resident at a time.
+    codes = list(codes)
+    window = max_length - 2  # room for <s> ... </s>
+    stride = min(stride, window)
+    embeddings = np.zeros((len(codes), model.config.hidden_size), dtype=np.float32)
+    weights = np.zeros(len(codes), dtype=np.float32)
+    chunks = [{'spans': [], 'vectors': []} for _ in codes] if keep_chunks else None
+    pending = []
+
+    def flush():
+        batch = [[tokenizer.cls_token_id] + ids + [tokenizer.sep_token_id] for _, _, ids in pending]
+        vectors = _embed_padded_batch(batch, tokenizer, model, device)
+        for (k, span, ids), vector in zip(pending, vectors):
+            weight = max(len(ids), 1)
+            embeddings[k] += vector * weight
+            weights[k] += weight
+            if keep_chunks:
+                chunks[k]['spans'].append(span)
+                chunks[k]['vectors'].append(vector)
+        pending.clear()
+
+    # Visit files shortest first so windows of similar length share a batch
+    for k in sorted(range(len(codes)), key=lambda k: len(codes[k])):
+        with _tokenizer_lock:
+            encoded = tokenizer(codes[k], add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        ids, offsets = encoded['input_ids'], encoded['offset_mapping']
+        for start, window_ids in _iter_windows(ids, window, stride):
+            end = start + len(window_ids)
+            span = (offsets[start][0], offsets[end - 1][1]) if window_ids else (0, 0)
+            pending.append((k, span, window_ids))
+            if len(pending) >= batch_size:
+                flush()
+    if pending:
+        flush()
+
+    embeddings /= weights[:, None]
+    if keep_chunks:
+        for chunk in chunks:
+            chunk['vectors'] = np.vstack(chunk['vectors'])
+    return embeddings, chunks
+
+EMBED_GROUP_FILES = 64  # files tokenized and embedded together when fed from an iterator
+
+@metrics.stage('embedding')
+def embed_files(codes, tokenizer, model, device, chunked=True, batch_size=16, cache=None, progress=None, total=None):
+    # `codes` may be any iterable (e.g. a generator over an upload); it is
+    # consumed EMBED_GROUP_FILES at a time, so token ids and window batches
+    # only ever exist for one group. Identical contents are embedded once.
+    # progress(fraction, message), if given, is called after every group, with
+    # the fraction of `total` codes done (jobs are cancelled from there).
+    def embed(batch):
+        metrics.count('files_embedded', len(batch))
+        if chunked:
+            return get_chunked_embeddings(batch, tokenizer, model, device, batch_size=batch_size, keep_chunks=False)[0]
+        return get_graphcodebert_embeddings(batch, tokenizer, model, device, batch_size=batch_size)
+
+    namespace = embedding_namespace(model, chunked) if cache is not None else None
+    codes = iter(codes)
+    hashes, vectors = [], {}
+    while True:
+        group = list(itertools.islice(codes, EMBED_GROUP_FILES))
+        if not group:
+            break
+        group_hashes = [content_hash(code) for code in group]
+        hashes.extend(group_hashes)
+        unseen = {key for key in group_hashes if key not in vectors}
+        if cache is not None and unseen:
+            vectors.update(cache.get_many(unseen, namespace))
+        # Only files never seen before (deduplicated by content) reach the model
+        missing = {}
+        for key, code in zip(group_hashes, group):
+            if key not in vectors:
+                missing.setdefault(key, code)
+        if missing:
+            fresh = dict(zip(missing, embed(list(missing.values()))))
+            if cache is not None:
+                cache.put_many(fresh, namespace)
+            vectors.update(fresh)
+        if progress is not None:
+            total = total or len(hashes)
+            progress(min(len(hashes) / total, 1.0), f"Embedded {len(hashes)} of {total}")
+    if not hashes:
+        return np.empty((0, model.config.hidden_size), dtype=np.float32)
+    return np.vstack([vectors[key] for key in hashes])
+
+def backend_drift(codes, backend, reference='torch', model_name=MODEL_NAME, chunked=True, batch_size=16):
+    # Embeds a reference corpus with both backends and reports how far the
+    # candidate's file vectors and pairwise scores move from the reference
+    # ones, and the throughput of each
+    codes = list(codes)
+    runs = {}
+    for name in (reference, backend):
+        tokenizer, model, device = get_model(model_name, name)
+        start = time.perf_counter()
+        vectors = embed_files(codes, tokenizer, model, device, chunked=chunked, batch_size=batch_size)
+        runs[name] = (vectors, time.perf_counter() - start)
+    (expected, expected_seconds), (actual, actual_seconds) = runs[reference], runs[backend]
+    cosines = np.einsum('ij,ij->i', normalize_rows(expected), normalize_rows(actual))
+    upper = np.triu_indices(len(codes), k=1)
+    deltas = np.abs(similarity_matrix(expected)[upper] - similarity_matrix(actual)[upper])
+    return {
+        'backend': backend,
+        'reference': reference,
+        'files': len(codes),
+        'min_cosine': float(cosines.min()) if len(codes) else 1.0,
+        'mean_cosine': float(cosines.mean()) if len(codes) else 1.0,
+        'max_score_delta': float(deltas.max()) if len(deltas) else 0.0,
+        'mean_score_delta': float(deltas.mean()) if len(deltas) else 0.0,
+        'reference_files_per_second': len(codes) / expected_seconds if expected_seconds else None,
+        'backend_files_per_second': len(codes) / actual_seconds if actual_seconds else None,
+    }
 
 def get_graphcodebert_embedding(code, tokenizer, model, device):
-    inputs = tokenizer(code, return_tensors="pt", truncation=True, max_length=512, padding=True).to(device)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    embedding = outputs.last_hidden_state.mean(dim=1).cpu().numpy()
-    return embedding
-
-def highlight_similar_portions(code1, code2, file_ext):
-    tokens1, raw_code1 = tokenize_code(code1, file_ext)
-    tokens2, raw_code2 = tokenize_code(code2, file_ext)
-    
+    return get_graphcodebert_embeddings([code], tokenizer, model, device)
+
+def _difflib_matches(tokens1, tokens2):
+    matched1 = [False] * len(tokens1)
+    matched2 = [False] * len(tokens2)
     matcher = difflib.SequenceMatcher(None, tokens1, tokens2)
-    highlighted1, highlighted2 = [], []
-    matching_tokens = []
-    
-    # Highlight identical tokens
     for op, i1, i1_end, i2, i2_end in matcher.get_opcodes():
         if op == 'equal':
-            for i in range(i1, i1_end):
-                highlighted1.append(f'<font color="red">{escape(tokens1[i])}</font>')
-                matching_tokens.append(tokens1[i])
-            for i in range(i2, i2_end):
-                highlighted2.append(f'<font color="red">{escape(tokens2[i])}</font>')
+            matched1[i1:i1_end] = [True] * (i1_end - i1)
+            matched2[i2:i2_end] = [True] * (i2_end - i2)
+    return matched1, matched2
+
+MAX_HIGHLIGHT_LINES = 50  # snippets are truncated for readability
+
+def _render_highlight(code, tokens, matched):
+    # Rebuilds the source from token spans, wrapping matched stretches in one
+    # <font> run. Runs never cross a line break, so truncating by lines
+    # never leaves an open tag.
+    out, run = [], []
+    last = 0
+    for token, hit in zip(tokens, matched):
+        gap = code[last:token.start]
+        if run and (not hit or '\n' in gap or gap.strip()):
+            out.append(f'<font color="red">{"".join(run)}</font>')
+            run = []
+        if run:
+            run.append(escape(gap))
         else:
-            for i in range(i1, i1_end):
-                highlighted1.append(escape(tokens1[i]))
-            for i in range(i2, i2_end):
-                highlighted2.append(escape(tokens2[i]))
-    
-    # Debug: Log all matching tokens
-    print(f"Matching tokens for pair: {matching_tokens}")
-    
-    # Reconstruct code by joining tokens
-    highlighted_code1 = ''.join(highlighted1)
-    highlighted_code2 = ''.join(highlighted2)
-    
-    # Truncate to 50 lines for readability
-    lines1 = highlighted_code1.split('\n')[:50]
-    lines2 = highlighted_code2.split('\n')[:50]
-    
-    return '\n'.join(lines1), '\n'.join(lines2)
+            out.append(escape(gap))
+        (run if hit else out).append(escape(token.text))
+        last = token.end
+    if run:
+        out.append(f'<font color="red">{"".join(run)}</font>')
+    out.append(escape(code[last:]))
+    return ''.join(out)
 
-def compute_similarity_pair(i, j, files, embeddings, file_ext):
-    score = cosine_similarity(embeddings[i], embeddings[j])[0][0]
-    if score > 0.3:  # 30% threshold
-        highlighted1, highlighted2 = highlight_similar_portions(files[i]['content'], files[j]['content'], file_ext)
+def _lex_for_highlight(code, file_ext):
+    code = code.strip()
+    return code, lex(code, file_ext)
+
+def _render_head(code, tokens, matched, max_lines=MAX_HIGHLIGHT_LINES):
+    # Renders only the first max_lines lines; everything after them would be
+    # cut from the snippet anyway
+    if max_lines <= 0:
+        return ''
+    end = -1
+    for _ in range(max_lines):
+        end = code.find('\n', end + 1)
+        if end < 0:
+            return _render_highlight(code, tokens, matched)
+    kept = next((k for k, token in enumerate(tokens) if token.end > end), len(tokens))
+    return _render_highlight(code[:end], tokens[:kept], matched[:kept])
+
+def _render_pair(code1, tokens1, matched1, code2, tokens2, matched2):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Matching tokens for pair: %s", [token.text for token, hit in zip(tokens1, matched1) if hit])
+    return _render_head(code1, tokens1, matched1), _render_head(code2, tokens2, matched2)
+
+def highlight_similar_portions(code1, code2, file_ext, matcher='gst'):
+    code1, tokens1 = _lex_for_highlight(code1, file_ext)
+    code2, tokens2 = _lex_for_highlight(code2, file_ext)
+    texts1 = token_texts(tokens1)
+    texts2 = token_texts(tokens2)
+
+    if matcher == 'difflib':
+        matched1, matched2 = _difflib_matches(texts1, texts2)
+    else:
+        matched1, matched2 = match_token_streams(texts1, texts2)
+    return _render_pair(code1, tokens1, matched1, code2, tokens2, matched2)
+
+@metrics.stage('highlighting')
+def highlight_pairs(files, pairs, file_ext, progress=None):
+    # Highlights many (i, j) pairs at once: each file is lexed once and the
+    # tiling runs on the highlight process pool. Returns (code1, code2) per pair.
+    lexed = {k: _lex_for_highlight(files[k]['content'], file_ext) for k in sorted({k for pair in pairs for k in pair})}
+    slots = {k: n for n, k in enumerate(lexed)}
+    streams = [token_texts(tokens) for _, tokens in lexed.values()]
+    metrics.count('highlighted_pairs', len(pairs))
+    metrics.count('lexed_tokens', sum(len(stream) for stream in streams))
+    highlights = [None] * len(pairs)
+    for n, tiles in tile_pairs(streams, [(slots[i], slots[j]) for i, j in pairs], progress=progress):
+        (code1, tokens1), (code2, tokens2) = lexed[pairs[n][0]], lexed[pairs[n][1]]
+        matched1, matched2 = tile_flags(tiles, len(tokens1), len(tokens2))
+        highlights[n] = _render_pair(code1, tokens1, matched1, code2, tokens2, matched2)
+    return highlights
+
+SIMILARITY_THRESHOLD = 0.3  # 30% threshold
+
+def pair_result(i, j, files, score, file_ext, threshold=SIMILARITY_THRESHOLD, highlight=None):
+    # `highlight` is a precomputed (code1, code2) from highlight_pairs()
+    if score > threshold:
+        highlighted1, highlighted2 = highlight or highlight_similar_portions(files[i]['content'], files[j]['content'],
+                                                                             file_ext)
         return {
             'file1': files[i]['filename'],
             'file2': files[j]['filename'],
@@ -101,99 +456,402 @@ def compute_similarity_pair(i, j, files, embeddings, file_ext):
         'highlight': None
     }
 
-def generate_pdf_report(scores, output_file, file_count):
-    doc = SimpleDocTemplate(output_file, pagesize=A4, rightMargin=0.75*inch, leftMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
-    styles = getSampleStyleSheet()
-    code_style = ParagraphStyle(name='Code', fontName='Courier', fontSize=8, leading=10, wordWrap='CJK')
-    
-    elements = []
-    
-    elements.append(Paragraph("Code Similarity Report for Classroom", styles['Title']))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    elements.append(Paragraph("Summary", styles['Heading2']))
-    elements.append(Paragraph(f"Total Files Processed: {file_count}", styles['Normal']))
-    elements.append(Paragraph(f"Total Comparisons: {len(scores)}", styles['Normal']))
-    elements.append(Spacer(1, 0.2*inch))
+def compute_similarity_pair(i, j, files, embeddings, file_ext):
+    score = cosine_similarity(np.atleast_2d(embeddings[i]), np.atleast_2d(embeddings[j]))[0][0]
+    return pair_result(i, j, files, score, file_ext)
+
+def normalize_rows(embeddings):
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def iter_similarity_tiles(embeddings, block_size=1024):
+    # Upper-triangular tiles of the cosine similarity matrix, one matmul each
+    normed = normalize_rows(embeddings)
+    for row in range(0, len(normed), block_size):
+        for col in range(row, len(normed), block_size):
+            yield row, col, normed[row:row + block_size] @ normed[col:col + block_size].T
+
+def similarity_matrix(embeddings, block_size=1024):
+    n = len(embeddings)
+    matrix = np.empty((n, n), dtype=np.float32)
+    for row, col, tile in iter_similarity_tiles(embeddings, block_size):
+        matrix[row:row + tile.shape[0], col:col + tile.shape[1]] = tile
+        matrix[col:col + tile.shape[1], row:row + tile.shape[0]] = tile.T
+    return matrix
+
+def _tile_pairs(row, col, tile):
+    if row == col:
+        rows, cols = np.triu_indices(tile.shape[0], k=1, m=tile.shape[1])
+    else:
+        rows, cols = np.indices(tile.shape).reshape(2, -1)
+    return rows + row, cols + col, tile[rows, cols]
+
+def _score_results(files, rows, cols, values, file_ext, threshold, progress=None, highlighter=None):
+    # Only above-threshold pairs go through the (expensive) highlighting step;
+    # highlighter(pairs, progress) replaces whole-file highlight_pairs()
+    metrics.count('pairs', len(values))
+    above = values > threshold
+    with metrics.stage('scoring'):
+        scores = [pair_result(i, j, files, score, file_ext, threshold)
+                  for i, j, score in zip(rows[~above].tolist(), cols[~above].tolist(), values[~above].tolist())]
+    hot = list(zip(rows[above].tolist(), cols[above].tolist(), values[above].tolist()))
+    if highlighter is None:
+        highlighter = lambda pairs, progress: highlight_pairs(files, pairs, file_ext, progress)
+    highlights = highlighter([(i, j) for i, j, _ in hot], progress)
+    for (i, j, score), highlight in zip(hot, highlights):
+        scores.append(pair_result(i, j, files, score, file_ext, threshold, highlight))
+    return scores
+
+def score_pairs(files, embeddings, file_ext, threshold=SIMILARITY_THRESHOLD, block_size=1024, progress=None):
+    with metrics.stage('scoring'):
+        tiles = [_tile_pairs(row, col, tile) for row, col, tile in iter_similarity_tiles(embeddings, block_size)]
+        if not tiles:
+            return []
+        rows, cols, values = (np.concatenate(parts) for parts in zip(*tiles))
+    return _score_results(files, rows, cols, values, file_ext, threshold, progress)
+
+SIMILARITY_MODES = ('neural', 'hybrid', 'fingerprint', 'function')
+FINGERPRINT_WEIGHT = 0.5  # share of the winnowing Jaccard score in hybrid mode
+# Pairs below this never reach the model in hybrid mode. Fingerprints hash
+# the normalized stream (ID/NUM/STR), where unrelated files still share
+# common 8-grams: on benchmarks/corpus.py classes (py/java/c/cpp, 30 files,
+# 2-12 functions, 12 seeds) unrelated pairs top out at 0.24 (median 0.09)
+# and plagiarized ones start at 0.59.
+HYBRID_MIN_JACCARD = 0.3
+
+@metrics.stage('fingerprint')
+def fingerprint_candidates(files, file_ext, min_similarity=0.0):
+    index = FingerprintIndex()
+    for file in files:
+        tokens = tokenize_code(file['content'], file_ext, normalize=True)[0]
+        metrics.count('lexed_tokens', len(tokens))
+        index.add(tokens)
+    return index.candidate_pairs(min_similarity)
+
+def score_candidate_pairs(files, candidates, file_ext, embeddings=None, threshold=SIMILARITY_THRESHOLD,
+                          fingerprint_weight=FINGERPRINT_WEIGHT, progress=None):
+    pairs = sorted(candidates)
+    if not pairs:
+        return []
+    rows, cols = np.array(pairs).T
+    values = np.array([candidates[pair] for pair in pairs], dtype=np.float32)
+    if embeddings is not None:
+        normed = normalize_rows(embeddings)
+        neural = np.einsum('ij,ij->i', normed[rows], normed[cols])
+        values = (1 - fingerprint_weight) * neural + fingerprint_weight * values
+    return _score_results(files, rows, cols, values, file_ext, threshold, progress)
+
+UNIT_TOP_WEIGHT = 0.5  # share of the best single function match in a function-mode file score
+UNIT_MATCH_THRESHOLD = 0.9  # further function pairs shown in a highlight besides the best one
+MAX_UNIT_MATCHES = 5  # function pairs shown per highlighted file pair
+
+@metrics.stage('units')
+def split_files(files, file_ext):
+    # [(code, tokens, units)] per file; each file is lexed once for both
+    # splitting and highlighting
+    split = []
+    for file in files:
+        code, tokens = _lex_for_highlight(file['content'], file_ext)
+        split.append((code, tokens, split_units(code, tokens, file_ext)))
+    metrics.count('units', sum(len(units) for _, _, units in split))
+    return split
+
+def _render_units(code, tokens, units, flags):
+    # Only the matched functions, each under a one-line header
+    parts, budget = [], MAX_HIGHLIGHT_LINES
+    for unit, matched in zip(units, flags):
+        if budget <= 0:
+            break
+        shifted = [token._replace(start=token.start - unit.start, end=token.end - unit.start)
+                   for token in tokens[unit.first:unit.last]]
+        header = escape(f"--- {unit.name or 'whole file'} (lines {unit.line}-{unit.end_line}) ---")
+        parts.append(f"{header}\n{_render_head(code[unit.start:unit.end], shifted, matched, budget - 1)}")
+        budget -= 2 + code.count('\n', unit.start, unit.end)
+    return '\n'.join('\n'.join(parts).split('\n')[:MAX_HIGHLIGHT_LINES])
+
+@metrics.stage('highlighting')
+def highlight_unit_pairs(split, vectors, offsets, pairs, progress=None):
+    # Highlights file pairs by their matched functions only: the best partners
+    # between the two files' units are picked from the unit vectors, and the
+    # token tiling runs on those function pairs instead of the whole files.
+    # vectors are normalized unit vectors; offsets[k] is file k's first unit.
+    unit_pairs, matches = [], []
+    for i, j in pairs:
+        matched = matched_unit_pairs(vectors[offsets[i]:offsets[i + 1]], vectors[offsets[j]:offsets[j + 1]],
+                                     UNIT_MATCH_THRESHOLD, MAX_UNIT_MATCHES)
+        matches.append(matched)
+        unit_pairs.extend((offsets[i] + a, offsets[j] + b) for a, b, _ in matched)
+    metrics.count('highlighted_pairs', len(pairs))
+    metrics.count('highlighted_units', len(unit_pairs))
+
+    owners = np.repeat(np.arange(len(split)), np.diff(offsets))
+    needed = sorted({u for pair in unit_pairs for u in pair})
+    slots = {u: n for n, u in enumerate(needed)}
+    streams = []
+    for u in needed:
+        unit = split[owners[u]][2][u - offsets[owners[u]]]
+        streams.append(token_texts(split[owners[u]][1][unit.first:unit.last]))
+    flags = {}
+    for n, tiles in tile_pairs(streams, [(slots[a], slots[b]) for a, b in unit_pairs], progress=progress):
+        a, b = unit_pairs[n]
+        flags[a, b] = tile_flags(tiles, len(streams[slots[a]]), len(streams[slots[b]]))
+
+    highlights = []
+    for (i, j), matched in zip(pairs, matches):
+        (code1, tokens1, units1), (code2, tokens2, units2) = split[i], split[j]
+        pair_flags = [flags[offsets[i] + a, offsets[j] + b] for a, b, _ in matched]
+        highlights.append((_render_units(code1, tokens1, [units1[a] for a, _, _ in matched],
+                                         [f[0] for f in pair_flags]),
+                           _render_units(code2, tokens2, [units2[b] for _, b, _ in matched],
+                                         [f[1] for f in pair_flags])))
+    return highlights
+
+def score_units(files, split, vectors, file_ext, threshold=SIMILARITY_THRESHOLD, progress=None):
+    # File scores aggregated from function matches (see units.file_scores);
+    # vectors holds one row per unit, in file order
+    offsets = np.concatenate([[0], np.cumsum([len(units) for _, _, units in split])])
+    owners = np.repeat(np.arange(len(files)), np.diff(offsets))
+    weights = [unit.last - unit.first for _, _, units in split for unit in units]
+    with metrics.stage('scoring'):
+        normed = normalize_rows(vectors)
+        best = best_matches(normed, owners, len(files))
+        matrix = file_scores(best, owners, weights, len(files), UNIT_TOP_WEIGHT)
+        rows, cols = np.triu_indices(len(files), k=1)
+        # Files without any code have no units and score 0
+        values = np.maximum(matrix[rows, cols], 0)
+    return _score_results(files, rows, cols, values, file_ext, threshold, progress,
+                          lambda pairs, progress: highlight_unit_pairs(split, normed, offsets, pairs, progress))
+
+def _scaled(progress, start, end):
+    if progress is None:
+        return None
+    return lambda fraction, message: progress(start + (end - start) * fraction, message)
+
+def compare_files(files, file_ext, mode='neural', chunked=True, cache=None, threshold=SIMILARITY_THRESHOLD,
+                  progress=None, backend=None):
+    # Returns (scores, embeddings); embeddings is None unless every file was embedded.
+    # 'fingerprint' never loads the model; 'hybrid' embeds only files that share
+    # fingerprints with another file and only scores those pairs; 'function'
+    # embeds each function separately and has no file vectors.
+    # progress(fraction, message), if given, is called between stages and
+    # after every group of embedded files.
+    report = progress or (lambda fraction, message: None)
+    metrics.count('files', len(files))
+    if mode == 'fingerprint':
+        report(0.0, "Fingerprinting files")
+        candidates = fingerprint_candidates(files, file_ext)
+        return score_candidate_pairs(files, candidates, file_ext, threshold=threshold,
+                                     progress=_scaled(progress, 0.2, 1.0)), None
+    report(0.0, "Loading model")
+    tokenizer, model, device = get_model(backend=backend)
+    if mode == 'function':
+        report(0.05, "Splitting files into functions")
+        split = split_files(files, file_ext)
+        count = sum(len(units) for _, _, units in split)
+        report(0.1, f"Embedding {count} functions from {len(files)} files")
+        vectors = embed_files((code[unit.start:unit.end] for code, _, units in split for unit in units),
+                              tokenizer, model, device, chunked=chunked, cache=cache,
+                              progress=_scaled(progress, 0.1, 0.5), total=count)
+        report(0.5, "Matching functions")
+        return score_units(files, split, vectors, file_ext, threshold, progress=_scaled(progress, 0.5, 1.0)), None
+    if mode == 'hybrid':
+        report(0.05, "Fingerprinting files")
+        candidates = fingerprint_candidates(files, file_ext, HYBRID_MIN_JACCARD)
+        needed = sorted({k for pair in candidates for k in pair})
+        embeddings = np.zeros((len(files), model.config.hidden_size), dtype=np.float32)
+        report(0.1, f"Embedding {len(needed)} of {len(files)} files")
+        if needed:
+            embeddings[needed] = embed_files((files[k]['content'] for k in needed), tokenizer, model, device,
+                                             chunked=chunked, cache=cache, progress=_scaled(progress, 0.1, 0.5),
+                                             total=len(needed))
+        scores = score_candidate_pairs(files, candidates, file_ext, embeddings, threshold,
+                                       progress=_scaled(progress, 0.5, 1.0))
+        return scores, embeddings if len(needed) == len(files) else None
+    report(0.1, f"Embedding {len(files)} files")
+    embeddings = embed_files((file['content'] for file in files), tokenizer, model, device, chunked=chunked, cache=cache,
+                             progress=_scaled(progress, 0.1, 0.5), total=len(files))
+    report(0.5, "Scoring pairs")
+    return score_pairs(files, embeddings, file_ext, threshold, progress=_scaled(progress, 0.5, 1.0)), embeddings
+
+MAX_TABLE_ROWS = 1000  # pairs listed in the ranking table; the rest are summarized
+TABLE_CHUNK_ROWS = 250  # rows per Table, so ReportLab never lays out one huge table
+
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+class _FlowableStream(list):
+    # A list that refills itself from a generator, so doc.build() only ever
+    # holds a small window of pending flowables instead of the whole report
+    def __init__(self, source, window=32):
+        super().__init__()
+        self._source = iter(source)
+        self._window = window
+
+    def _fill(self):
+        while list.__len__(self) < self._window:
+            try:
+                list.append(self, next(self._source))
+            except StopIteration:
+                break
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+def _chunked_tables(header, rows, chunk_rows=TABLE_CHUNK_ROWS):
+    for start in range(0, len(rows), chunk_rows):
+        table = Table([header] + rows[start:start + chunk_rows], repeatRows=1)
+        table.setStyle(_TABLE_STYLE)
+        yield table
+
+def _file_summaries(scores, threshold):
+    # filename -> [best score, best match, number of pairs above threshold]
+    summaries = {}
+    for score in scores:
+        for name, other in ((score['file1'], score['file2']), (score['file2'], score['file1'])):
+            summary = summaries.setdefault(name, [-1.0, '', 0])
+            if score['score'] > summary[0]:
+                summary[0], summary[1] = score['score'], other
+            if score['score'] > threshold:
+                summary[2] += 1
+    return sorted(summaries.items(), key=lambda item: item[1][0], reverse=True)
+
+def _report_flowables(scores, file_count, styles, code_style, max_table_rows, threshold):
+    yield Paragraph("Code Similarity Report for Classroom", styles['Title'])
+    yield Spacer(1, 0.2*inch)
     
-    elements.append(Paragraph("Similarity Scores (Sorted by Score)", styles['Heading2']))
-    sorted_scores = sorted(scores, key=lambda x: x['score'], reverse=True)
-    table_data = [['File Pair', 'Similarity Score']]
-    for score in sorted_scores:
-        table_data.append([f"{score['file1']} vs {score['file2']}", f"{score['score']:.2%}"])
+    yield Paragraph("Summary", styles['Heading2'])
+    yield Paragraph(f"Total Files Processed: {file_count}", styles['Normal'])
+    yield Paragraph(f"Total Comparisons: {len(scores)}", styles['Normal'])
+    yield Spacer(1, 0.2*inch)
     
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 0.2*inch))
+    yield Paragraph("Similarity Scores (Sorted by Score)", styles['Heading2'])
+    if len(scores) > max_table_rows:
+        top_scores = heapq.nlargest(max_table_rows, scores, key=lambda x: x['score'])
+    else:
+        top_scores = sorted(scores, key=lambda x: x['score'], reverse=True)
+    rows = [[f"{score['file1']} vs {score['file2']}", f"{score['score']:.2%}"] for score in top_scores]
+    yield from _chunked_tables(['File Pair', 'Similarity Score'], rows)
+    if len(scores) > len(top_scores):
+        yield Paragraph(f"Showing the top {len(top_scores)} of {len(scores)} pairs; "
+                        f"the remaining pairs score at most {top_scores[-1]['score']:.2%}.", styles['Normal'])
+    yield Spacer(1, 0.2*inch)
+
+    yield Paragraph("Per-File Summary", styles['Heading2'])
+    rows = [[name, best_match, f"{best:.2%}", str(above)]
+            for name, (best, best_match, above) in _file_summaries(scores, threshold)]
+    yield from _chunked_tables(['File', 'Closest Match', 'Best Score', f'Pairs Above {threshold:.0%}'], rows)
+    yield Spacer(1, 0.2*inch)
     
-    elements.append(Paragraph("Highlighted Similarities (Above 30%)", styles['Heading2']))
-    if not any(score['highlight'] for score in sorted_scores):
-        elements.append(Paragraph("No pairs with similarity above 30% found.", styles['Normal']))
+    yield Paragraph(f"Highlighted Similarities (Above {threshold:.0%})", styles['Heading2'])
+    highlighted = sorted((score for score in scores if score['highlight']), key=lambda x: x['score'], reverse=True)
+    if not highlighted:
+        yield Paragraph(f"No pairs with similarity above {threshold:.0%} found.", styles['Normal'])
     
-    for score in sorted_scores:
-        if score['highlight']:
-            elements.append(Spacer(1, 0.2*inch))
-            elements.append(Paragraph(f"{score['highlight']['file1']} vs {score['highlight']['file2']} ({score['score']:.2%})", styles['Heading3']))
-            elements.append(Paragraph(f"{score['highlight']['file1']}:", styles['Heading4']))
-            elements.append(Paragraph(score['highlight']['code1'], code_style))
-            elements.append(Paragraph(f"{score['highlight']['file2']}:", styles['Heading4']))
-            elements.append(Paragraph(score['highlight']['code2'], code_style))
-            elements.append(Spacer(1, 0.1*inch))
+    for score in highlighted:
+        yield Spacer(1, 0.2*inch)
+        yield Paragraph(f"{score['highlight']['file1']} vs {score['highlight']['file2']} ({score['score']:.2%})", styles['Heading3'])
+        yield Paragraph(f"{score['highlight']['file1']}:", styles['Heading4'])
+        yield Paragraph(score['highlight']['code1'], code_style)
+        yield Paragraph(f"{score['highlight']['file2']}:", styles['Heading4'])
+        yield Paragraph(score['highlight']['code2'], code_style)
+        yield Spacer(1, 0.1*inch)
+
+@metrics.stage('pdf')
+def generate_pdf_report(scores, output_file, file_count, max_table_rows=MAX_TABLE_ROWS, threshold=SIMILARITY_THRESHOLD):
+    doc = SimpleDocTemplate(output_file, pagesize=A4, rightMargin=0.75*inch, leftMargin=0.75*inch, topMargin=0.75*inch, bottomMargin=0.75*inch)
+    styles = getSampleStyleSheet()
+    code_style = ParagraphStyle(name='Code', fontName='Courier', fontSize=8, leading=10, wordWrap='CJK')
     
-    doc.build(elements)
+    # Flowables are generated section by section while the document is laid out
+    doc.build(_FlowableStream(_report_flowables(scores, file_count, styles, code_style, max_table_rows, threshold)))
 
 def main():
     parser = argparse.ArgumentParser(description="CodeSim Report")
-    parser.add_argument('directory', help="Directory containing student code files")
+    parser.add_argument('directory', help="Directory or zip/tar archive containing student code files")
     parser.add_argument('--file-type', required=True, choices=['py', 'java', 'c', 'cpp'], 
                        help="File type to process (py, java, c, cpp)")
     parser.add_argument('--output', default='classroom_similarity_report.pdf', 
                        help="Output PDF file for similarity report")
+    parser.add_argument('--truncate', action='store_true',
+                       help="Embed only the first 512 tokens of each file instead of sliding windows")
+    parser.add_argument('--cache', metavar='PATH',
+                       help="SQLite file used to cache embeddings between runs")
+    parser.add_argument('--mode', default='neural', choices=SIMILARITY_MODES,
+                       help="neural: GraphCodeBERT on all pairs; hybrid: winnowing pre-filter, then GraphCodeBERT; "
+                            "fingerprint: winnowing only, no model; function: GraphCodeBERT per function, "
+                            "files scored and highlighted by their matching functions")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=EMBEDDING_BACKENDS,
+                       help="torch: fp32 PyTorch; int8: dynamically quantized PyTorch; onnx: ONNX Runtime")
+    parser.add_argument('--check-drift', action='store_true',
+                       help="Compare --backend against fp32 PyTorch on the files in the directory and exit")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                       help="DEBUG also logs the matching tokens of every highlighted pair")
+    parser.add_argument('--profile', action='store_true',
+                       help="Log a cProfile summary of the run along with the per-stage timings")
     args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(levelname)s %(name)s: %(message)s')
 
-    if not os.path.isdir(args.directory):
-        print(f"Error: {args.directory} is not a valid directory")
+    if not os.path.isdir(args.directory) and not (os.path.isfile(args.directory) and is_archive(args.directory)):
+        logger.error("%s is not a valid directory or archive", args.directory)
         return
 
-    files = []
-    for filename in os.listdir(args.directory):
-        if filename.endswith(f'.{args.file_type}'):
-            with open(os.path.join(args.directory, filename), 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                files.append({'filename': filename, 'content': content, 'ext': args.file_type})
+    ingest = Ingest(file_ext=args.file_type)
+    try:
+        if os.path.isdir(args.directory):
+            for filename in sorted(os.listdir(args.directory)):
+                if filename.endswith(f'.{args.file_type}'):
+                    with open(os.path.join(args.directory, filename), 'rb') as f:
+                        ingest.add(filename, f)
+        else:
+            with open(args.directory, 'rb') as f:
+                ingest.add_archive(f, os.path.basename(args.directory))
+    except IngestError as e:
+        logger.error("%s", e)
+        return
+    files = list(ingest.iter_files())
 
     if len(files) < 2:
-        print("Error: At least two files are required for comparison")
+        logger.error("At least two files are required for comparison")
         return
     if len(files) > 40:
-        print(f"Warning: Found {len(files)} files, expected up to 40")
+        logger.warning("Found %d files, expected up to 40", len(files))
 
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    tokenizer = AutoTokenizer.from_pretrained("microsoft/graphcodebert-base")
-    model = AutoModel.from_pretrained("microsoft/graphcodebert-base").to(device)
-
-    embeddings = [get_graphcodebert_embedding(file['content'], tokenizer, model, device) for file in files]
+    if args.check_drift:
+        drift = backend_drift([file['content'] for file in files], args.backend, chunked=not args.truncate)
+        for key, value in drift.items():
+            logger.info("%s: %s", key, f"{value:.4f}" if isinstance(value, float) else value)
+        return
 
-    scores = Parallel(n_jobs=-1)(
-        delayed(compute_similarity_pair)(i, j, files, embeddings, args.file_type)
-        for i in range(len(files))
-        for j in range(i + 1, len(files))
-    )
+    cache = EmbeddingCache(args.cache) if args.cache else None
+    with metrics.collect(profile=args.profile) as breakdown:
+        scores, _ = compare_files(files, args.file_type, mode=args.mode, chunked=not args.truncate, cache=cache,
+                                  backend=args.backend)
+        try:
+            generate_pdf_report(scores, args.output, len(files))
+            logger.info("PDF report generated at %s", args.output)
+        except Exception as e:
+            logger.error("Error generating PDF: %s", e)
 
-    try:
-        generate_pdf_report(scores, args.output, len(files))
-        print(f"PDF report generated at {args.output}")
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
+    timings = breakdown.as_dict()
+    for name, seconds in sorted(timings['stages'].items(), key=lambda item: -item[1]):
+        logger.info("%-12s %8.3fs", name, seconds)
+    logger.info("counters: %s, peak RSS %.0f MiB", timings['counters'], timings['peak_rss_bytes'] / 2**20)
+    if breakdown.profile:
+        logger.info("cProfile summary:\n%s", breakdown.profile)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+# SQLite access shared by the app and the utils modules. Each thread keeps
+# one open connection per database file instead of connecting per call, so
+# sqlite's statement cache actually gets reused ("prepared" queries) and
+# pragmas are paid once. Connections run in WAL mode: readers never block the
+# writer and vice versa, which is what removes the "database is locked"
+# stalls between dashboard loads, logins and job progress updates. Writers
+# still serialize; busy_timeout makes them wait instead of failing.
+#
+# Safe under multi-worker gunicorn: pools are keyed by process id, so a
+# worker forked after the master touched the database (e.g. with --preload)
+# opens its own connections instead of reusing the parent's.
+#
+# Schemas are versioned with PRAGMA user_version; migrate() applies the
+# missing steps of a list in one write transaction, so concurrent workers
+# starting together migrate exactly once.
+
+BUSY_TIMEOUT = 30  # seconds a writer waits for the lock
+STATEMENT_CACHE_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_inherited = []  # connections opened before a fork; kept referenced so the child never closes them
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    # In WAL mode NORMAL only syncs at checkpoints and stays consistent on crash
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+def connect(path):
+    # The calling thread's connection to `path`; do not close it
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        if getattr(_local, 'pool', None):
+            _inherited.append(_local.pool)
+        _local.pid = pid
+        _local.pool = {}
+    key = os.path.abspath(path)
+    conn = _local.pool.get(key)
+    if conn is None:
+        conn = _local.pool[key] = _open(path)
+    return conn
+
+@contextmanager
+def transaction(path, immediate=False):
+    # Commits on success and rolls back on error. immediate=True takes the
+    # write lock up front, for read-then-write sequences that must not race
+    conn = connect(path)
+    if immediate:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+def close_all():
+    # Closes the calling thread's connections (tests, shutdown)
+    for conn in getattr(_local, 'pool', {}).values():
+        conn.close()
+    _local.pool = {}
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def migrate(path, migrations):
+    # migrations[k] is a callable taking the connection; it brings the schema
+    # from user_version k to k + 1. Returns the number of steps applied
+    with transaction(path, immediate=True) as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for step in range(version, len(migrations)):
+            migrations[step](conn)
+            logger.info("Migrated %s to schema version %d", path, step + 1)
+        if version < len(migrations):
+            conn.execute(f'PRAGMA user_version = {len(migrations)}')
+    return max(len(migrations) - version, 0)
@@ -0,0 +1,66 @@
+import time
+import hashlib
+import numpy as np
+from utils import db
+
+# Persistent embedding store keyed by (namespace, sha256 of file content).
+# The namespace identifies everything else that determines a vector: model
+# name, model revision and embedding mode. Entries are evicted least recently
+# used first once the store grows past max_entries.
+
+def content_hash(code):
+    return hashlib.sha256(code.encode('utf-8', errors='replace')).hexdigest()
+
+def embedding_namespace(model, chunked):
+    name = getattr(model.config, 'name_or_path', '') or type(model).__name__
+    revision = getattr(model.config, '_commit_hash', None) or 'local'
+    backend = getattr(model, 'embedding_backend', 'torch')
+    namespace = f"{name}@{revision}/{'chunked' if chunked else 'truncated'}"
+    # fp32 keeps the original namespace so existing cache entries stay valid
+    return namespace if backend == 'torch' else f"{namespace}+{backend}"
+
+class EmbeddingCache:
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        with db.transaction(path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS embeddings
+                            (namespace TEXT,
+                             content_hash TEXT,
+                             dim INTEGER,
+                             vector BLOB,
+                             last_access INTEGER,
+                             PRIMARY KEY (namespace, content_hash))''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)')
+
+    def get_many(self, hashes, namespace):
+        hashes = list(hashes)
+        found = {}
+        conn = db.connect(self.path)
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            rows = conn.execute(
+                f'SELECT content_hash, vector FROM embeddings WHERE namespace = ? AND content_hash IN ({",".join("?" * len(part))})',
+                [namespace, *part]).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = int(time.time())
+            with db.transaction(self.path) as conn:
+                conn.executemany('UPDATE embeddings SET last_access = ? WHERE namespace = ? AND content_hash = ?',
+                                 [(now, namespace, key) for key in found])
+        return found
+
+    def put_many(self, vectors, namespace):
+        now = int(time.time())
+        rows = [(namespace, key, int(vector.shape[-1]), np.ascontiguousarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in vectors.items()]
+        with db.transaction(self.path) as conn:
+            conn.executemany('INSERT OR REPLACE INTO embeddings (namespace, content_hash, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)', rows)
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute('DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)',
+                         (count - self.max_entries,))
@@ -0,0 +1,81 @@
+import zlib
+from collections import defaultdict
+from itertools import combinations
+from utils.matcher import window_hashes
+
+# MOSS-style winnowing (Schleimer, Wilkerson & Aiken 2003). Every k-gram of
+# significant tokens is hashed; from each run of `window` consecutive hashes
+# the minimum is kept as a fingerprint. Any shared run of at least
+# k + window - 1 tokens is guaranteed to produce a shared fingerprint.
+# Fingerprints present in most files of a large class (starter code,
+# boilerplate) carry no signal and are ignored when pairing.
+
+DEFAULT_K = 8
+DEFAULT_WINDOW = 4
+COMMON_FINGERPRINT_MIN_FILES = 10
+COMMON_FINGERPRINT_RATIO = 0.5
+
+def _token_id(token):
+    # Stable across processes, unlike hash(str)
+    return zlib.crc32(token.encode('utf-8', errors='replace'))
+
+def winnow(hashes, window=DEFAULT_WINDOW):
+    if not hashes:
+        return set()
+    if len(hashes) <= window:
+        return {min(hashes)}
+    fingerprints = set()
+    last = -1
+    for start in range(len(hashes) - window + 1):
+        segment = hashes[start:start + window]
+        smallest = min(segment)
+        # Rightmost minimum, so equal hashes in overlapping windows are not re-selected
+        position = start + window - 1 - segment[::-1].index(smallest)
+        if position != last:
+            fingerprints.add(smallest)
+            last = position
+    return fingerprints
+
+def fingerprint_tokens(tokens, k=DEFAULT_K, window=DEFAULT_WINDOW):
+    ids = [_token_id(token) for token in tokens]
+    if len(ids) < k:
+        return {hash(tuple(ids))} if ids else set()
+    return winnow(window_hashes(ids, k), window)
+
+class FingerprintIndex:
+    def __init__(self, k=DEFAULT_K, window=DEFAULT_WINDOW):
+        self.k = k
+        self.window = window
+        self.postings = defaultdict(list)
+        self.fingerprints = []
+
+    def add(self, tokens):
+        doc = len(self.fingerprints)
+        fingerprints = fingerprint_tokens(tokens, self.k, self.window)
+        self.fingerprints.append(fingerprints)
+        for fp in fingerprints:
+            self.postings[fp].append(doc)
+        return doc
+
+    def _common(self):
+        n = len(self.fingerprints)
+        if n < COMMON_FINGERPRINT_MIN_FILES:
+            return set()
+        return {fp for fp, docs in self.postings.items() if len(docs) > COMMON_FINGERPRINT_RATIO * n}
+
+    def candidate_pairs(self, min_similarity=0.0):
+        # {(i, j): Jaccard similarity} for every pair sharing a fingerprint
+        common = self._common()
+        shared = defaultdict(int)
+        for fp, docs in self.postings.items():
+            if fp in common:
+                continue
+            for pair in combinations(docs, 2):
+                shared[pair] += 1
+        sizes = [len(fps - common) if common else len(fps) for fps in self.fingerprints]
+        candidates = {}
+        for (i, j), count in shared.items():
+            similarity = count / (sizes[i] + sizes[j] - count)
+            if similarity >= min_similarity:
+                candidates[(i, j)] = similarity
+        return candidates
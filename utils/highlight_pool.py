@@ -0,0 +1,141 @@
+import os
+import uuid
+import atexit
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from utils.matcher import greedy_string_tiling, DEFAULT_MIN_MATCH
+
+# Runs Greedy String Tiling for many pairs on a persistent process pool. The
+# token streams of a batch are integer encoded once into a single int32 file
+# that every worker memory-maps read-only, so a task is just two (start, end)
+# ranges and the result is the list of tiles; nothing is pickled per pair but
+# offsets. Pairs are submitted largest first so one big pair cannot end up
+# as the last task on an otherwise idle pool.
+#
+# The pool uses the 'spawn' start method: the web process runs job worker
+# threads and holds a torch model, neither of which survives fork() safely.
+# Spawned workers re-import the parent's __main__ (app.py when run as a
+# script), so that module must not do anything at import time. Workers are
+# started on demand, so small batches never spawn the whole pool.
+#
+# A pool whose worker died (OOM kill, segfault) is broken for good: it is
+# dropped, the rest of the batch is tiled in-process and the next batch
+# starts a new pool.
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_WORKERS = int(os.getenv('CODESIM_HIGHLIGHT_WORKERS', os.cpu_count() or 1))
+MIN_PARALLEL_PAIRS = 4  # fewer pairs than this are tiled in-process
+
+_pool = None
+_pool_lock = threading.Lock()
+_streams = {}  # worker side: path -> memmapped stream of the current batch
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def warm_pool(workers=None):
+    # Starts the workers ahead of the first batch; spawning re-imports the
+    # parent's modules in every worker, which can take seconds
+    workers = HIGHLIGHT_WORKERS if workers is None else workers
+    if workers > 1:
+        list(_get_pool(workers).map(abs, range(workers)))
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+def _attach(path, size):
+    stream = _streams.get(path)
+    if stream is None:
+        # One batch at a time per worker: drop the mapping of the previous one
+        _streams.clear()
+        stream = _streams[path] = np.memmap(path, dtype=np.int32, mode='r', shape=(size,))
+    return stream
+
+def _tile_task(path, size, span_a, span_b, min_match):
+    stream = _attach(path, size)
+    a = stream[span_a[0]:span_a[1]].tolist()
+    b = stream[span_b[0]:span_b[1]].tolist()
+    return greedy_string_tiling(a, b, min_match)
+
+def encode_streams(streams):
+    # One shared vocabulary; returns the concatenated int32 array and the
+    # (start, end) range of each stream in it
+    vocab = {}
+    encoded, spans, offset = [], [], 0
+    for tokens in streams:
+        encoded.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+        spans.append((offset, offset + len(tokens)))
+        offset += len(tokens)
+    return np.array(encoded, dtype=np.int32), spans
+
+def tile_pairs(streams, pairs, min_match=DEFAULT_MIN_MATCH, workers=None, progress=None):
+    # Yields (pair index, tiles) for each (i, j) in `pairs`, in completion
+    # order; tiles index into streams[i] and streams[j]
+    workers = HIGHLIGHT_WORKERS if workers is None else workers
+    encoded, spans = encode_streams(streams)
+    order = sorted(range(len(pairs)), key=lambda k: -(spans[pairs[k][0]][1] - spans[pairs[k][0]][0])
+                   * (spans[pairs[k][1]][1] - spans[pairs[k][1]][0]))
+    if workers <= 1 or len(pairs) < MIN_PARALLEL_PAIRS or not len(encoded):
+        yield from _tile_in_process(encoded, spans, pairs, order, 0, min_match, progress)
+        return
+
+    # Workers cache their mapping by path, so every batch gets a fresh name
+    fd, path = tempfile.mkstemp(prefix=f'codesim-tokens-{uuid.uuid4().hex}-', suffix='.i32')
+    done = set()
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            encoded.tofile(handle)
+        pool = _get_pool(workers)
+        futures = {}
+        try:
+            for k in order:
+                futures[pool.submit(_tile_task, path, len(encoded), spans[pairs[k][0]], spans[pairs[k][1]],
+                                    min_match)] = k
+            for future in as_completed(futures):
+                if progress:
+                    progress(len(done) / len(pairs), f"Highlighting pair {len(done) + 1} of {len(pairs)}")
+                tiles = future.result()
+                done.add(futures[future])
+                yield futures[future], tiles
+        except BrokenProcessPool:
+            logger.warning("Highlight pool broke (worker died); tiling the remaining pairs in-process")
+            _discard_pool(pool)
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        os.remove(path)
+    if len(done) < len(pairs):
+        yield from _tile_in_process(encoded, spans, pairs, [k for k in order if k not in done], len(done),
+                                    min_match, progress)
+
+def _tile_in_process(encoded, spans, pairs, order, done, min_match, progress):
+    values = encoded.tolist()
+    for n, k in enumerate(order, done):
+        if progress:
+            progress(n / len(pairs), f"Highlighting pair {n + 1} of {len(pairs)}")
+        (a0, a1), (b0, b1) = spans[pairs[k][0]], spans[pairs[k][1]]
+        yield k, greedy_string_tiling(values[a0:a1], values[b0:b1], min_match)
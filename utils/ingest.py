@@ -0,0 +1,182 @@
+import io
+import os
+import hashlib
+import functools
+import tarfile
+import zipfile
+import posixpath
+from werkzeug.utils import secure_filename
+
+# Upload ingestion. Single files and zip/tar archives of a whole class are
+# streamed chunk by chunk: each member is hashed while it is written, once,
+# to a content-addressed blob (in a per-job scratch directory, or in memory
+# for the CLI). Identical submissions are stored once and decoded once;
+# every filename is kept, since identical files are exactly what the checker
+# must report. iter_files() then yields the decoded files one at a time.
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+CHUNK_SIZE = 64 * 1024
+MAX_MEMBERS = 2000
+MAX_MEMBER_BYTES = 2 * 1024 * 1024  # a single source file larger than this is not student code
+MAX_EXPANDED_BYTES = 256 * 1024 * 1024  # total after decompression, against archive bombs
+
+class IngestError(ValueError):
+    pass
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+def decode_source(data):
+    if data.startswith(b'\xef\xbb\xbf'):
+        data = data[3:]
+    return data.decode('utf-8', errors='ignore')
+
+def _safe_name(path):
+    # Archive paths keep their folders (alice/main.py and bob/main.py must not
+    # collide) but every component is sanitized, so nothing escapes the job
+    parts = [secure_filename(part) for part in path.replace('\\', '/').split('/')]
+    return '/'.join(part for part in parts if part)
+
+def _skipped_member(path):
+    parts = posixpath.normpath(path.replace('\\', '/')).split('/')
+    return any(part.startswith('.') or part == '__MACOSX' for part in parts)
+
+class Ingest:
+    def __init__(self, directory=None, file_ext=None):
+        # With a directory, blobs are files named by their hash; otherwise
+        # they are kept in memory
+        self.directory = directory
+        self.file_ext = file_ext
+        self.files = []  # [(filename, digest)] in upload order
+        self.skipped = []
+        self.blobs = {}
+        self.expanded_bytes = 0
+        self._names = set()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _unique_name(self, name):
+        candidate, n = name, 1
+        while candidate in self._names:
+            n += 1
+            stem, ext = os.path.splitext(name)
+            candidate = f"{stem}_{n}{ext}"
+        self._names.add(candidate)
+        return candidate
+
+    def _wanted(self, name):
+        return self.file_ext is None or name.lower().endswith(f'.{self.file_ext}')
+
+    def add(self, name, reader):
+        # Streams one file from `reader` (anything with .read(n)); returns its digest
+        name = _safe_name(name)
+        if not name:
+            raise IngestError("File has no usable name")
+        digest = hashlib.sha256()
+        size = 0
+        if self.directory:
+            partial = os.path.join(self.directory, f'.partial-{len(self.files)}')
+            sink = open(partial, 'wb')
+        else:
+            sink = io.BytesIO()
+        try:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                self.expanded_bytes += len(chunk)
+                if size > MAX_MEMBER_BYTES:
+                    raise IngestError(f"{name} is larger than {MAX_MEMBER_BYTES // 2**20} MiB")
+                if self.expanded_bytes > MAX_EXPANDED_BYTES:
+                    raise IngestError(f"Upload expands to more than {MAX_EXPANDED_BYTES // 2**20} MiB")
+                digest.update(chunk)
+                sink.write(chunk)
+            key = digest.hexdigest()
+            if self.directory:
+                sink.close()
+                blob = os.path.join(self.directory, key)
+                if os.path.exists(blob):
+                    os.remove(partial)
+                else:
+                    os.replace(partial, blob)
+            elif key not in self.blobs:
+                self.blobs[key] = sink.getvalue()
+        finally:
+            sink.close()
+            if self.directory and os.path.exists(partial):
+                os.remove(partial)
+        self.files.append((self._unique_name(name), key))
+        return key
+
+    def add_archive(self, fileobj, filename):
+        # Only members with the expected extension are kept; folders, links,
+        # hidden files and other file types are skipped
+        # Limits apply to kept members only, so an unrelated large file (slides,
+        # a binary) does not reject the class. An archive is all or nothing:
+        # on error the members already read are dropped again, so which files
+        # get checked never depends on member order
+        members, first = 0, len(self.files)
+        try:
+            for path, size, opener in self._iter_members(fileobj, filename):
+                if _skipped_member(path) or not self._wanted(path):
+                    self.skipped.append(path)
+                    continue
+                members += 1
+                if members > MAX_MEMBERS:
+                    raise IngestError(f"{filename} has more than {MAX_MEMBERS} files")
+                if size > MAX_MEMBER_BYTES:
+                    raise IngestError(f"{path} is larger than {MAX_MEMBER_BYTES // 2**20} MiB")
+                with opener() as reader:
+                    self.add(path, reader)
+        except IngestError:
+            self._names.difference_update(name for name, _ in self.files[first:])
+            del self.files[first:]
+            raise
+
+    def _iter_members(self, fileobj, filename):
+        # Yields (path, declared size, opener); a member is only opened when
+        # it is kept
+        try:
+            if filename.lower().endswith('.zip'):
+                with zipfile.ZipFile(fileobj) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir():
+                            continue
+                        yield info.filename, info.file_size, functools.partial(archive.open, info)
+            else:
+                # 'r|*' reads the tar as a stream, member after member, with
+                # transparent gzip/bzip2/xz decompression
+                with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+                    for member in archive:
+                        if member.isfile():
+                            yield member.name, member.size, functools.partial(archive.extractfile, member)
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+            raise IngestError(f"Could not read archive {filename}: {e}") from e
+
+    def add_upload(self, fileobj, filename):
+        if is_archive(filename):
+            self.add_archive(fileobj, filename)
+        else:
+            self.add(filename, fileobj)
+
+    def manifest(self):
+        return [[name, digest] for name, digest in self.files]
+
+    def iter_files(self, file_ext=None):
+        return iter_files(self.manifest(), file_ext or self.file_ext, self.directory, self.blobs)
+
+def iter_files(manifest, file_ext, directory=None, blobs=None):
+    # Yields {'filename', 'content', 'ext'} per manifest entry, reading and
+    # decoding each distinct blob once; duplicates share the same string
+    decoded = {}
+    for name, digest in manifest:
+        content = decoded.get(digest)
+        if content is None:
+            if directory:
+                with open(os.path.join(directory, digest), 'rb') as f:
+                    content = decode_source(f.read())
+            else:
+                content = decode_source(blobs[digest])
+            decoded[digest] = content
+        yield {'filename': name, 'content': content, 'ext': file_ext}
@@ -0,0 +1,199 @@
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from utils import metrics, db
+
+# SQLite-backed background job queue. Jobs are rows in the `jobs` table;
+# worker threads in the web process claim the oldest queued job, run the
+# handler and store its JSON result. Because the workers live in the web
+# process they share the warm model from the checker's registry.
+#
+# The handler is called as handler(params, progress) where
+# progress(fraction, message) records progress and raises JobCancelled once a
+# cancellation has been requested, so long-running handlers stop at their
+# next progress update. Progress updates double as the job's heartbeat:
+# idle workers periodically fail running jobs whose last update is older
+# than STALE_AFTER, which is how jobs left behind by a process that died
+# (crash, restart, killed gunicorn worker) are cleaned up. The same sweep
+# deletes finished jobs (and their stored results) after `retention`
+# seconds. progress() writes at most once per PROGRESS_INTERVAL, so a
+# handler may call it as often as it likes (e.g. once per highlighted pair).
+#
+# The jobs table is part of the app's versioned schema: create_jobs_table is
+# one of app.MIGRATIONS, so the database must be migrated before a queue is
+# used.
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = 15 * 60  # running jobs with no progress for this long are failed
+STALE_CHECK_INTERVAL = 60  # seconds between stale-job checks
+FINISHED_RETENTION = 7 * 24 * 3600  # finished jobs are deleted this long after they ended
+PROGRESS_INTERVAL = 1.0  # minimum seconds between progress writes of one job
+STATUS_COLUMNS = ('id', 'user_id', 'status', 'progress', 'message', 'error')
+
+def create_jobs_table(conn):
+    # A schema migration step, see app.MIGRATIONS
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs
+                    (id TEXT PRIMARY KEY,
+                     user_id INTEGER,
+                     status TEXT,
+                     progress REAL,
+                     message TEXT,
+                     params TEXT,
+                     result TEXT,
+                     error TEXT,
+                     cancel_requested INTEGER DEFAULT 0,
+                     created_at INTEGER,
+                     updated_at INTEGER)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)')
+
+class JobCancelled(Exception):
+    pass
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+class JobQueue:
+    def __init__(self, db_path, handler, workers=1, poll_interval=2.0, retention=FINISHED_RETENTION):
+        self.db_path = db_path
+        self.retention = retention
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_stale_check = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'codesim-job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, user_id, params, job_id=None):
+        job_id = job_id or new_job_id()
+        now = int(time.time())
+        with db.transaction(self.db_path) as conn:
+            conn.execute('''INSERT INTO jobs (id, user_id, status, progress, message, params, created_at, updated_at)
+                            VALUES (?, ?, 'queued', 0, 'Queued', ?, ?, ?)''',
+                         (job_id, user_id, json.dumps(params), now, now))
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        # The pooled connection is shared, so the row factory is set on this cursor only
+        cursor = db.connect(self.db_path).cursor()
+        cursor.row_factory = sqlite3.Row
+        row = cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params']) if job['params'] else None
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def get_status(self, job_id, result_fields=()):
+        # STATUS_COLUMNS plus the named top-level fields of the result, read
+        # with json_extract so status polls never load or decode the result
+        cursor = db.connect(self.db_path).cursor()
+        cursor.row_factory = sqlite3.Row
+        fields = ''.join(f", json_extract(result, '$.{field}') AS {field}" for field in result_fields)
+        row = cursor.execute(f'SELECT {", ".join(STATUS_COLUMNS)}{fields} FROM jobs WHERE id = ?',
+                             (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def cancel(self, job_id):
+        now = int(time.time())
+        with db.transaction(self.db_path) as conn:
+            conn.execute('''UPDATE jobs SET status = 'cancelled', message = 'Cancelled', updated_at = ?
+                            WHERE id = ? AND status = 'queued' ''', (now, job_id))
+            conn.execute('''UPDATE jobs SET cancel_requested = 1, message = 'Cancelling', updated_at = ?
+                            WHERE id = ? AND status = 'running' ''', (now, job_id))
+
+    def _fail_stale_jobs(self):
+        now = int(time.time())
+        with db.transaction(self.db_path) as conn:
+            failed = conn.execute('''UPDATE jobs SET status = 'failed', message = 'Failed', updated_at = ?,
+                                     error = 'Worker stopped before the job finished'
+                                     WHERE status = 'running' AND updated_at < ?''', (now, now - STALE_AFTER)).rowcount
+        if failed:
+            logger.warning("Failed %d stale job(s)", failed)
+            metrics.count('jobs', failed, status='failed')
+
+    def _delete_finished_jobs(self):
+        with db.transaction(self.db_path) as conn:
+            deleted = conn.execute('''DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled')
+                                      AND updated_at < ?''', (int(time.time()) - self.retention,)).rowcount
+        if deleted:
+            logger.info("Deleted %d finished job(s)", deleted)
+
+    def _claim(self):
+        # BEGIN IMMEDIATE takes the write lock, so two workers (or two
+        # processes) can never claim the same row
+        with db.transaction(self.db_path, immediate=True) as conn:
+            row = conn.execute('''SELECT id FROM jobs WHERE status = 'queued'
+                                  ORDER BY created_at LIMIT 1''').fetchone()
+            if row is None:
+                return None
+            conn.execute('''UPDATE jobs SET status = 'running', message = 'Starting', updated_at = ?
+                            WHERE id = ?''', (int(time.time()), row[0]))
+            return row[0]
+
+    def _worker_loop(self):
+        while True:
+            if time.monotonic() - self._last_stale_check >= STALE_CHECK_INTERVAL:
+                # Workers race harmlessly here; the update is idempotent
+                self._last_stale_check = time.monotonic()
+                self._fail_stale_jobs()
+                self._delete_finished_jobs()
+            job_id = self._claim()
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job_id)
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = int(time.time())
+        with db.transaction(self.db_path) as conn:
+            conn.execute(f'UPDATE jobs SET {", ".join(f"{name} = ?" for name in fields)} WHERE id = ?',
+                         (*fields.values(), job_id))
+
+    def _progress(self, job_id):
+        last = 0.0
+
+        def progress(fraction, message):
+            nonlocal last
+            now = time.monotonic()
+            if now - last < PROGRESS_INTERVAL:
+                return
+            last = now
+            with db.transaction(self.db_path) as conn:
+                conn.execute('UPDATE jobs SET progress = ?, message = ?, updated_at = ? WHERE id = ?',
+                             (fraction, message, int(time.time()), job_id))
+                cancelled = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+            if cancelled:
+                raise JobCancelled()
+        return progress
+
+    def _run(self, job_id):
+        job = self.get(job_id)
+        try:
+            result = self.handler(job['params'], self._progress(job_id))
+        except JobCancelled:
+            self._update(job_id, status='cancelled', message='Cancelled')
+            metrics.count('jobs', status='cancelled')
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self._update(job_id, status='failed', message='Failed', error=str(e))
+            metrics.count('jobs', status='failed')
+        else:
+            self._update(job_id, status='done', progress=1.0, message='Done', result=json.dumps(result))
+            metrics.count('jobs', status='done')
@@ -0,0 +1,132 @@
+import re
+from collections import namedtuple
+
+# Single-pass regex lexers for the languages in ALLOWED_EXTENSIONS. Each
+# language compiles one alternation of named groups; comments and whitespace
+# are matched (so '#' or '//' inside a string literal stays part of the
+# string) but never emitted. Tokens keep their offset and line so matches can
+# be mapped back onto the original source.
+#
+# token_stream() is the fast path for callers that only need the texts
+# (tokenize_code, fingerprinting): the same alternation, but whitespace and
+# comments are skipped inside each match and tokens land in plain groups, so
+# re.findall() does the whole scan in C and no Token objects are built.
+
+Token = namedtuple('Token', 'kind text start end line')
+
+_DQ_STRING = r'"(?:[^"\\\n]|\\.)*"?'
+_SQ_STRING = r"'(?:[^'\\\n]|\\.)*'?"
+_C_COMMENT = r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)'
+_NUMBER = r'0[xXbBoO][0-9a-fA-F_]+[lLuU]*|(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:[eE][+-]?\d+)?[a-zA-Z]*'
+_OPERATORS = r'>>>=|<<=|>>=|\*\*=|//=|===|!==|\.\.\.|<=>|\?\?=|->|=>|::|\+\+|--|&&|\|\||\*\*|<<|>>|\?\?|[-+*/%&|^!=<>]=?|\S'
+
+_KEYWORDS = {
+    'py': '''False None True and as assert async await break class continue def del elif else except finally
+             for from global if import in is lambda nonlocal not or pass raise return try while with yield''',
+    'java': '''abstract assert boolean break byte case catch char class const continue default do double else enum
+               extends final finally float for goto if implements import instanceof int interface long native new
+               package private protected public return short static strictfp super switch synchronized this throw
+               throws transient try void volatile while var record true false null''',
+    'c': '''auto break case char const continue default do double else enum extern float for goto if inline int long
+            register restrict return short signed sizeof static struct switch typedef union unsigned void volatile
+            while bool true false NULL''',
+    'cpp': '''alignas alignof and auto bool break case catch char class const constexpr const_cast continue decltype
+              default delete do double dynamic_cast else enum explicit export extern false float for friend goto if
+              inline int long mutable namespace new noexcept not nullptr operator or private protected public
+              register reinterpret_cast return short signed sizeof static static_cast struct switch template this
+              throw true try typedef typeid typename union unsigned using virtual void volatile while std''',
+    'js': '''async await break case catch class const continue debugger default delete do else export extends false
+             finally for function if import in instanceof let new null of return static super switch this throw true
+             try typeof undefined var void while with yield''',
+    'php': '''abstract and array as break callable case catch class clone const continue declare default do echo else
+              elseif empty enddeclare endfor endforeach endif endswitch endwhile extends final finally fn for foreach
+              function global goto if implements include include_once instanceof insteadof interface isset list match
+              namespace new or print private protected public readonly require require_once return static switch
+              throw trait try unset use var while xor yield true false null''',
+}
+
+_SPECS = {
+    'py': (r'\#[^\n]*',
+           r'''(?i:[rbuf]{0,2})(?:"""[\s\S]*?(?:"""|\Z)|\'\'\'[\s\S]*?(?:\'\'\'|\Z)|''' + _DQ_STRING + '|' + _SQ_STRING + ')',
+           r'[A-Za-z_]\w*'),
+    'java': (_C_COMMENT, r'"""[\s\S]*?(?:"""|\Z)|' + _DQ_STRING + '|' + _SQ_STRING, r'[A-Za-z_$][\w$]*'),
+    'c': (_C_COMMENT, r'(?:L|u8?|U)?(?:' + _DQ_STRING + '|' + _SQ_STRING + ')', r'[A-Za-z_]\w*'),
+    'cpp': (_C_COMMENT, r'(?:L|u8?|U)?(?:R"(?P<delim>[^(\s]*)\([\s\S]*?\)(?P=delim)"|' + _DQ_STRING + '|' + _SQ_STRING + ')',
+            r'[A-Za-z_]\w*'),
+    'js': (_C_COMMENT, r'`(?:[^`\\]|\\[\s\S])*`?|' + _DQ_STRING + '|' + _SQ_STRING, r'[A-Za-z_$][\w$]*'),
+    'php': (r'\#[^\n]*|' + _C_COMMENT, _DQ_STRING + '|' + _SQ_STRING, r'\$?[A-Za-z_]\w*'),
+}
+
+_lexers = {}
+
+def _lexer(file_ext):
+    file_ext = file_ext if file_ext in _SPECS else 'c'
+    lexer = _lexers.get(file_ext)
+    if lexer is None:
+        comment, string, name = _SPECS[file_ext]
+        pattern = re.compile(
+            f'(?P<comment>{comment})|(?P<string>{string})|(?P<number>{_NUMBER})|'
+            f'(?P<name>{name})|(?P<space>\\s+)|(?P<operator>{_OPERATORS})')
+        lexer = _lexers[file_ext] = (pattern, frozenset(_KEYWORDS[file_ext].split()))
+    return lexer
+
+def iter_tokens(code, file_ext):
+    pattern, keywords = _lexer(file_ext)
+    line, last = 1, 0
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        if kind == 'space' or kind == 'comment':
+            continue
+        start = match.start()
+        line += code.count('\n', last, start)
+        last = start
+        text = match.group()
+        if kind == 'name':
+            kind = 'keyword' if text in keywords else 'identifier'
+        yield Token(kind, text, start, match.end(), line)
+
+def lex(code, file_ext):
+    return list(iter_tokens(code, file_ext))
+
+_streams = {}
+
+def _stream_lexer(file_ext, normalize):
+    file_ext = file_ext if file_ext in _SPECS else 'c'
+    lexer = _streams.get((file_ext, normalize))
+    if lexer is None:
+        comment, string, name = _SPECS[file_ext]
+        # Once the skip stops on a non-space character some token matches, so
+        # the skip never backtracks; \Z swallows a trailing comment
+        skip = f'(?:\\s+|{comment})*'
+        if normalize:
+            token = f'(?P<string>{string})|(?P<number>{_NUMBER})|(?P<name>{name})|(?P<operator>{_OPERATORS})'
+        else:
+            token = f'(?P<token>(?:{string})|{_NUMBER}|{name}|{_OPERATORS})'
+        pattern = re.compile(f'{skip}(?:{token}|\\Z)')
+        # findall() rows are tuples when there are several groups (C++ raw
+        # strings add one); these are the positions of the named ones
+        groups = {kind: index - 1 for kind, index in pattern.groupindex.items()}
+        lexer = _streams[file_ext, normalize] = (pattern, groups, frozenset(_KEYWORDS[file_ext].split()))
+    return lexer
+
+def token_stream(code, file_ext, normalize=False):
+    # Same result as token_texts(lex(code, file_ext), normalize)
+    pattern, groups, keywords = _stream_lexer(file_ext, normalize)
+    rows = pattern.findall(code)
+    # \Z leaves one or two empty matches at the end
+    while rows and not any(rows[-1]):
+        rows.pop()
+    if not normalize:
+        return [row[groups['token']] for row in rows] if pattern.groups > 1 else rows
+    string, number, name, operator = (groups[kind] for kind in ('string', 'number', 'name', 'operator'))
+    return [row[operator] or ('STR' if row[string] else 'NUM' if row[number] else
+                              row[name] if row[name] in keywords else 'ID') for row in rows]
+
+_NORMALIZED = {'identifier': 'ID', 'number': 'NUM', 'string': 'STR'}
+
+def token_texts(tokens, normalize=False):
+    # With normalize=True identifiers and literals collapse to ID/NUM/STR, so
+    # renamed variables or changed constants still produce the same stream
+    if normalize:
+        return [_NORMALIZED.get(token.kind, token.text) for token in tokens]
+    return [token.text for token in tokens]
@@ -0,0 +1,91 @@
+from itertools import accumulate
+
+# Greedy String Tiling with Karp-Rabin window hashing (RKR-GST), the matching
+# algorithm used by JPlag/YAP3. Token streams are integer encoded once; each
+# round hashes the unmarked min_match-grams of one stream, looks up every
+# unmarked window of the other, extends hits to maximal matches and tiles them
+# longest first. Runs in near-linear time on realistic code, unlike
+# difflib.SequenceMatcher which degrades quadratically on repetitive tokens.
+
+DEFAULT_MIN_MATCH = 6
+MAX_BUCKET = 32
+_HASH_BASE = 1000003
+_HASH_MOD = (1 << 61) - 1
+
+def encode_tokens(*token_lists):
+    vocab = {}
+    return [[vocab.setdefault(token, len(vocab)) for token in tokens] for tokens in token_lists]
+
+def window_hashes(seq, k):
+    if len(seq) < k:
+        return []
+    high = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    h = 0
+    for value in seq[:k]:
+        h = (h * _HASH_BASE + value + 1) % _HASH_MOD
+    hashes = [h]
+    for i in range(k, len(seq)):
+        h = ((h - (seq[i - k] + 1) * high) * _HASH_BASE + seq[i] + 1) % _HASH_MOD
+        hashes.append(h)
+    return hashes
+
+def greedy_string_tiling(a, b, min_match=DEFAULT_MIN_MATCH, max_bucket=MAX_BUCKET):
+    # Returns non-overlapping tiles (start_a, start_b, length), longest first
+    marked_a = bytearray(len(a))
+    marked_b = bytearray(len(b))
+    hashes_a = window_hashes(a, min_match)
+    hashes_b = window_hashes(b, min_match)
+    tiles = []
+    while True:
+        # Prefix sums give O(1) "is this window unmarked" checks for the round
+        cum_a = [0, *accumulate(marked_a)]
+        cum_b = [0, *accumulate(marked_b)]
+        table = {}
+        for j, h in enumerate(hashes_b):
+            if cum_b[j + min_match] == cum_b[j]:
+                table.setdefault(h, []).append(j)
+        matches = []
+        covered = {}  # diagonal (i - j) -> end of the last match found on it
+        for i, h in enumerate(hashes_a):
+            candidates = table.get(h)
+            # Windows repeated more than max_bucket times are boilerplate; the
+            # surrounding match is still found from a neighbouring window
+            if not candidates or len(candidates) > max_bucket or cum_a[i + min_match] != cum_a[i]:
+                continue
+            for j in candidates:
+                if covered.get(i - j, -1) > i or a[i:i + min_match] != b[j:j + min_match]:
+                    continue
+                start_i, start_j = i, j
+                while (start_i and start_j and a[start_i - 1] == b[start_j - 1]
+                       and not marked_a[start_i - 1] and not marked_b[start_j - 1]):
+                    start_i -= 1
+                    start_j -= 1
+                end_i, end_j = i + min_match, j + min_match
+                while (end_i < len(a) and end_j < len(b) and a[end_i] == b[end_j]
+                       and not marked_a[end_i] and not marked_b[end_j]):
+                    end_i += 1
+                    end_j += 1
+                covered[i - j] = end_i
+                matches.append((end_i - start_i, start_i, start_j))
+        if not matches:
+            return tiles
+        matches.sort(key=lambda m: (-m[0], m[1], m[2]))
+        for length, i, j in matches:
+            # Matches occluded by a longer tile are retried, shortened, next round
+            if any(marked_a[i:i + length]) or any(marked_b[j:j + length]):
+                continue
+            marked_a[i:i + length] = b'\x01' * length
+            marked_b[j:j + length] = b'\x01' * length
+            tiles.append((i, j, length))
+
+def tile_flags(tiles, length_a, length_b):
+    matched_a = [False] * length_a
+    matched_b = [False] * length_b
+    for i, j, length in tiles:
+        matched_a[i:i + length] = [True] * length
+        matched_b[j:j + length] = [True] * length
+    return matched_a, matched_b
+
+def match_token_streams(tokens1, tokens2, min_match=DEFAULT_MIN_MATCH):
+    encoded1, encoded2 = encode_tokens(tokens1, tokens2)
+    return tile_flags(greedy_string_tiling(encoded1, encoded2, min_match), len(tokens1), len(tokens2))
@@ -0,0 +1,165 @@
+import io
+import time
+import pstats
+import cProfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Process-wide pipeline metrics. stage(name) times a block and count(name, n)
+# bumps a counter; both feed the process totals rendered by
+# render_prometheus() and, when the calling thread is inside collect(), that
+# run's own breakdown (stage seconds, counters, peak RSS and optionally a
+# cProfile summary). A sampler thread polls RSS while any run is collecting,
+# so each run gets its own peak instead of the process-lifetime high-water.
+# Totals are per process; under several gunicorn workers each one exposes its
+# own.
+
+RSS_SAMPLE_INTERVAL = 0.25
+PROFILE_LINES = 40  # functions kept from a cProfile capture, by cumulative time
+
+_lock = threading.Lock()
+_local = threading.local()
+_stage_seconds = defaultdict(float)
+_stage_calls = defaultdict(int)
+_counters = defaultdict(float)
+_active = set()
+_sampler = None
+_peak_rss = 0
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, AttributeError):
+        if resource is None:
+            return 0
+        # No /proc: fall back to the high-water mark (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _sample():
+    global _peak_rss
+    rss = _rss_bytes()
+    with _lock:
+        _peak_rss = max(_peak_rss, rss)
+        for breakdown in _active:
+            breakdown.peak_rss_bytes = max(breakdown.peak_rss_bytes, rss)
+
+def _sampler_loop():
+    while True:
+        if _active:
+            _sample()
+        time.sleep(RSS_SAMPLE_INTERVAL)
+
+def _start_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sampler_loop, name='codesim-rss-sampler', daemon=True)
+            _sampler.start()
+
+class Breakdown:
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(float)
+        self.peak_rss_bytes = 0
+        self.started = time.perf_counter()
+        self.profile = None
+
+    def as_dict(self):
+        result = {
+            'total_seconds': time.perf_counter() - self.started,
+            'stages': dict(self.stages),
+            'counters': {name: int(value) if value == int(value) else value for name, value in self.counters.items()},
+            'peak_rss_bytes': self.peak_rss_bytes,
+        }
+        if self.profile is not None:
+            result['profile'] = self.profile
+        return result
+
+def _breakdowns():
+    return getattr(_local, 'breakdowns', ())
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stage_seconds[name] += elapsed
+            _stage_calls[name] += 1
+        for breakdown in _breakdowns():
+            breakdown.stages[name] += elapsed
+        _sample()
+
+def count(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += value
+    if not labels:
+        for breakdown in _breakdowns():
+            breakdown.counters[name] += value
+
+@contextmanager
+def collect(profile=False):
+    # Records a breakdown of everything this thread runs inside the block
+    breakdown = Breakdown()
+    _local.breakdowns = _breakdowns() + (breakdown,)
+    with _lock:
+        _active.add(breakdown)
+    _start_sampler()
+    _sample()
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield breakdown
+    finally:
+        if profiler:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            breakdown.profile = out.getvalue()
+        _sample()
+        with _lock:
+            _active.discard(breakdown)
+        _local.breakdowns = tuple(b for b in _breakdowns() if b is not breakdown)
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+def render_prometheus():
+    # Prometheus text exposition format, version 0.0.4
+    _sample()
+    with _lock:
+        stage_seconds = dict(_stage_seconds)
+        stage_calls = dict(_stage_calls)
+        counters = dict(_counters)
+        peak_rss = _peak_rss
+    lines = ['# HELP codesim_stage_seconds Time spent in each pipeline stage.',
+             '# TYPE codesim_stage_seconds summary']
+    for name in sorted(stage_seconds):
+        lines.append(f'codesim_stage_seconds_sum{{stage="{name}"}} {stage_seconds[name]:.6f}')
+        lines.append(f'codesim_stage_seconds_count{{stage="{name}"}} {stage_calls[name]}')
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE codesim_{name}_total counter')
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f'codesim_{name}_total{_labels(labels)} {int(value) if value == int(value) else value}')
+    lines += ['# HELP codesim_resident_memory_bytes Current resident set size.',
+              '# TYPE codesim_resident_memory_bytes gauge',
+              f'codesim_resident_memory_bytes {_rss_bytes()}',
+              '# HELP codesim_peak_resident_memory_bytes Highest sampled resident set size.',
+              '# TYPE codesim_peak_resident_memory_bytes gauge',
+              f'codesim_peak_resident_memory_bytes {peak_rss}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from utils import metrics, db
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed report artifacts. A report's key is the hash of the file
+# set (names and content hashes) plus every parameter that changes the
+# output, so an identical re-run is answered with the stored PDF and result
+# instead of being recomputed. The key doubles as the PDF's name and strong
+# ETag. A background evictor removes artifacts not downloaded or reused for
+# max_age seconds, then the least recently used ones until the folder fits
+# in max_bytes.
+
+REPORT_FORMAT_VERSION = 1  # bump when the PDF layout or result shape changes
+
+def report_key(manifest, params):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': REPORT_FORMAT_VERSION, 'params': params,
+                              'files': sorted(map(list, manifest))}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def artifact_filename(key):
+    return f"report_{key[:32]}.pdf"
+
+def create_report_artifacts_table(conn):
+    # A schema migration step, see app.MIGRATIONS
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_artifacts
+                    (key TEXT PRIMARY KEY,
+                     filename TEXT UNIQUE,
+                     size INTEGER,
+                     result TEXT,
+                     created_at INTEGER,
+                     last_access INTEGER)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_report_artifacts_last_access ON report_artifacts (last_access)')
+
+class ReportCache:
+    def __init__(self, db_path, folder, max_bytes=1024**3, max_age=7 * 24 * 3600):
+        self.db_path = db_path
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._evictor = None
+        self._evictor_lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def adopt_existing(self):
+        # Reports written before the cache existed become artifacts too, so
+        # history and eviction cover them; runs once at startup
+        with db.transaction(self.db_path) as conn:
+            known = {row[0] for row in conn.execute('SELECT filename FROM report_artifacts')}
+            rows = []
+            for entry in os.scandir(self.folder):
+                if entry.is_file() and entry.name.endswith('.pdf') and entry.name not in known:
+                    stat = entry.stat()
+                    rows.append((f'legacy:{entry.name}', entry.name, stat.st_size, None, int(stat.st_mtime),
+                                 int(stat.st_mtime)))
+            conn.executemany('''INSERT OR IGNORE INTO report_artifacts (key, filename, size, result, created_at, last_access)
+                                VALUES (?, ?, ?, ?, ?, ?)''', rows)
+        return len(rows)
+
+    def get(self, key):
+        # Returns the stored job result for `key` (and marks it used), or None
+        row = db.connect(self.db_path).execute('SELECT filename, result FROM report_artifacts WHERE key = ?',
+                                               (key,)).fetchone()
+        if row is None or row[1] is None or not os.path.exists(self.path(row[0])):
+            metrics.count('report_cache', result='miss')
+            return None
+        with db.transaction(self.db_path) as conn:
+            conn.execute('UPDATE report_artifacts SET last_access = ? WHERE key = ?', (int(time.time()), key))
+        metrics.count('report_cache', result='hit')
+        return json.loads(row[1])
+
+    def put(self, key, filename, result):
+        now = int(time.time())
+        with db.transaction(self.db_path) as conn:
+            conn.execute('''INSERT OR REPLACE INTO report_artifacts (key, filename, size, result, created_at, last_access)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         (key, filename, os.path.getsize(self.path(filename)), json.dumps(result), now, now))
+
+    def touch(self, filename):
+        with db.transaction(self.db_path) as conn:
+            conn.execute('UPDATE report_artifacts SET last_access = ? WHERE filename = ?', (int(time.time()), filename))
+
+    def etag(self, filename):
+        row = db.connect(self.db_path).execute('SELECT key FROM report_artifacts WHERE filename = ?',
+                                               (filename,)).fetchone()
+        return row[0] if row else None
+
+    def evict(self):
+        now = int(time.time())
+        conn = db.connect(self.db_path)
+        rows = conn.execute('SELECT key, filename, size, last_access FROM report_artifacts ORDER BY last_access').fetchall()
+        total = sum(row[2] or 0 for row in rows)
+        expired = []
+        for key, filename, size, last_access in rows:
+            if last_access < now - self.max_age or total > self.max_bytes:
+                expired.append((key, filename))
+                total -= size or 0
+        # Rows go first, so a concurrent history query never lists a deleted file
+        with db.transaction(self.db_path) as conn:
+            conn.executemany('DELETE FROM report_artifacts WHERE key = ?', [(key,) for key, _ in expired])
+        for key, filename in expired:
+            try:
+                os.remove(self.path(filename))
+            except FileNotFoundError:
+                pass
+        if expired:
+            logger.info("Evicted %d report artifacts", len(expired))
+            metrics.count('report_evictions', len(expired))
+        return len(expired)
+
+    def _evict_loop(self, interval):
+        while True:
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Report eviction failed")
+            time.sleep(interval)
+
+    def start_evictor(self, interval=600):
+        with self._evictor_lock:
+            if self._evictor is None:
+                self._evictor = threading.Thread(target=self._evict_loop, args=(interval,),
+                                                 name='codesim-report-evictor', daemon=True)
+                self._evictor.start()
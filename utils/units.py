@@ -0,0 +1,182 @@
+import numpy as np
+from collections import namedtuple
+
+# Splits a lexed file into function-level units and matches units across
+# files. Python units follow indentation (a def/async def and its body,
+# decorators included); brace languages take every `{ ... }` block whose
+# header ends in a parameter list, i.e. functions, methods and constructors,
+# but not if/for/while/switch/catch (keywords) or class bodies. Only outermost
+# functions become units, so nested helpers and lambdas stay part of their
+# enclosing function; methods are units because a class body is not a
+# function. A file without any function of useful size is a single unit.
+#
+# Matching works on L2-normalized unit vectors, grouped by file: one blocked
+# matmul gives every unit's best match in every other file (a max-reduce over
+# each file's column range), and files are scored from those maxima.
+
+Unit = namedtuple('Unit', 'name start end first last line end_line')  # offsets into the code; token range [first, last)
+
+MIN_UNIT_TOKENS = 12  # shorter functions (getters, one-line wrappers) match everything
+_HEADER_LOOKBACK = 16  # tokens between ')' and '{' (throws clauses, const, noexcept, initializer lists)
+_HEADER_TOKENS = {'throws', 'const', 'noexcept', 'override', 'final', 'mutable', 'volatile', 'static', 'async',
+                  '->', '::', '.', ',', '&', '*', '<', '>', '?', ':', '(', ')'}
+_CONTROL = {'if', 'for', 'foreach', 'while', 'switch', 'catch', 'elseif', 'synchronized', 'with', 'using', 'return',
+            'sizeof', 'typeof', 'match'}
+
+def _line_start(code, offset):
+    return code.rfind('\n', 0, offset) + 1
+
+def _python_units(code, tokens):
+    # A def's body is every following line indented deeper than the def
+    line_heads = [k for k, token in enumerate(tokens) if k == 0 or tokens[k - 1].line != token.line]
+    indents = {k: tokens[k].start - _line_start(code, tokens[k].start) for k in line_heads}
+    units = []
+    n = 0
+    while n < len(line_heads):
+        k = line_heads[n]
+        offset = 1 if tokens[k].text == 'async' else 0
+        if k + offset + 1 >= len(tokens) or tokens[k + offset].text != 'def':
+            n += 1
+            continue
+        indent = indents[k]
+        # Decorators directly above the def belong to it
+        head = n
+        while head > 0 and tokens[line_heads[head - 1]].text == '@' and indents[line_heads[head - 1]] == indent:
+            head -= 1
+        end = n + 1
+        while end < len(line_heads) and indents[line_heads[end]] > indent:
+            end += 1
+        first, last = line_heads[head], line_heads[end] if end < len(line_heads) else len(tokens)
+        units.append(Unit(tokens[k + offset + 1].text, _line_start(code, tokens[first].start), tokens[last - 1].end,
+                          first, last, tokens[first].line, tokens[last - 1].line))
+        n = end
+    return units
+
+def _matching(tokens, k, step):
+    # Index of the bracket matching tokens[k], scanning forward (step 1) or back (step -1)
+    opening, closing = tokens[k].text, {'(': ')', ')': '(', '{': '}', '}': '{'}[tokens[k].text]
+    depth = 0
+    while 0 <= k < len(tokens):
+        if tokens[k].text == opening:
+            depth += 1
+        elif tokens[k].text == closing:
+            depth -= 1
+            if depth == 0:
+                return k
+        k += step
+    return None
+
+def _function_head(tokens, brace):
+    # (name, index of the token naming it) for the function whose body opens
+    # at tokens[brace], or None when the block is not a function body
+    k = brace - 1
+    while k >= 0 and brace - k <= _HEADER_LOOKBACK:
+        token = tokens[k]
+        if token.text == ')':
+            opening = _matching(tokens, k, -1)
+            if opening is None or opening == 0:
+                return None
+            before = tokens[opening - 1]
+            if before.kind == 'identifier':
+                if opening >= 2 and tokens[opening - 2].text in (':', ','):
+                    # C++ constructor initializer list: keep looking for the constructor
+                    k = opening - 2
+                    continue
+                return before.text, opening - 1
+            if before.text == 'function':
+                return '<anonymous>', opening - 1
+            if before.kind == 'keyword' and before.text in _CONTROL:
+                return None
+            k = opening - 1
+            continue
+        if token.text == '=>':
+            return '<arrow>', k
+        if token.kind != 'identifier' and token.text not in _HEADER_TOKENS:
+            return None
+        k -= 1
+    return None
+
+def _brace_units(code, tokens):
+    units = []
+    k = 0
+    while k < len(tokens):
+        if tokens[k].text != '{':
+            k += 1
+            continue
+        found = _function_head(tokens, k)
+        close = _matching(tokens, k, 1) if found else None
+        if close is None:
+            k += 1
+            continue
+        # The unit starts at the line holding the name, which also covers the
+        # return type and modifiers written before it
+        name, head = found
+        while head > 0 and tokens[head - 1].line == tokens[head].line and tokens[head - 1].text not in ';{}':
+            head -= 1
+        start = tokens[head].start if head and tokens[head - 1].line == tokens[head].line else \
+            _line_start(code, tokens[head].start)
+        units.append(Unit(name, start, tokens[close].end, head, close + 1, tokens[head].line, tokens[close].line))
+        k = close + 1
+    return units
+
+def split_units(code, tokens, file_ext, min_tokens=MIN_UNIT_TOKENS):
+    # `tokens` come from lexer.lex(code, file_ext)
+    if not tokens:
+        return []
+    units = _python_units(code, tokens) if file_ext == 'py' else _brace_units(code, tokens)
+    units = [unit for unit in units if unit.last - unit.first >= min_tokens]
+    if not units:
+        units = [Unit('', 0, len(code), 0, len(tokens), tokens[0].line, tokens[-1].line)]
+    return units
+
+def best_matches(vectors, owners, file_count, block_size=1024):
+    # vectors: normalized unit vectors sorted by owning file; owners[u] is the
+    # file of unit u. Returns best[u, f], the highest similarity between unit u
+    # and any unit of file f (-1 for u's own file and files without units).
+    owners = np.asarray(owners)
+    starts = np.searchsorted(owners, np.arange(file_count))
+    present = np.bincount(owners, minlength=file_count) > 0
+    best = np.full((len(vectors), file_count), -1.0, dtype=np.float32)
+    if not len(vectors):
+        return best
+    for row in range(0, len(vectors), block_size):
+        tile = vectors[row:row + block_size] @ vectors.T
+        # One max-reduce per file over its (contiguous) column range
+        best[row:row + block_size, present] = np.maximum.reduceat(tile, starts[present], axis=1)
+    best[np.arange(len(vectors)), owners] = -1.0
+    return best
+
+def file_scores(best, owners, weights, file_count, top_weight=0.5):
+    # score(i, j) blends the single best unit match between the two files with
+    # the share of the more-covered file that is matched in the other one
+    # (token-weighted mean of its units' best matches), so one copied function
+    # counts even in an otherwise original file.
+    owners = np.asarray(owners)
+    weights = np.asarray(weights, dtype=np.float32)
+    starts = np.searchsorted(owners, np.arange(file_count))
+    present = np.bincount(owners, minlength=file_count) > 0
+    top = np.full((file_count, file_count), -1.0, dtype=np.float32)
+    coverage = np.full((file_count, file_count), -1.0, dtype=np.float32)
+    if len(best):
+        top[present] = np.maximum.reduceat(best, starts[present], axis=0)
+        totals = np.add.reduceat(weights, starts[present])
+        coverage[present] = np.add.reduceat(best * weights[:, None], starts[present], axis=0) / totals[:, None]
+    return top_weight * np.maximum(top, top.T) + (1 - top_weight) * np.maximum(coverage, coverage.T)
+
+def matched_unit_pairs(vectors_a, vectors_b, min_similarity, max_pairs):
+    # Best partner in b for each unit of a, strongest first: [(a, b, similarity)].
+    # The single best pair is always kept so a flagged file pair is never shown empty.
+    if not len(vectors_a) or not len(vectors_b):
+        return []
+    similarity = vectors_a @ vectors_b.T
+    partners = similarity.argmax(axis=1)
+    scores = similarity[np.arange(len(vectors_a)), partners]
+    order = np.argsort(-scores, kind='stable')
+    pairs, used = [], set()
+    for a in order.tolist():
+        b = int(partners[a])
+        if b in used or (pairs and scores[a] < min_similarity) or len(pairs) >= max_pairs:
+            continue
+        used.add(b)
+        pairs.append((a, b, float(scores[a])))
+    return pairs
@@ -0,0 +1,243 @@
+import os
+import json
+import threading
+import contextlib
+import numpy as np
+from utils import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Persistent IVF (inverted file) index over L2-normalized vectors, scored by
+# cosine similarity. Vectors are appended to a raw float32 file that searches
+# memory-map, so only the rows of the probed lists are paged in. Until enough
+# vectors exist to train the coarse quantizer the index answers exactly.
+#
+# Tuning knobs: nlist (number of clusters; more = faster, lower recall),
+# nprobe (clusters visited per query; more = slower, higher recall) and
+# exact=True on search() for a brute-force scan.
+#
+# Layout of an index directory:
+#   meta.json      dim, count, nlist, trained
+#   vectors.f32    count x dim float32 rows
+#   lists.i32      cluster id of each row (-1 before training)
+#   centroids.npy  nlist x dim float32
+#   labels.db      row -> key, JSON metadata
+
+KMEANS_ITERATIONS = 10
+TRAIN_POINTS_PER_LIST = 39
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+def _nearest(vectors, centroids, block_size=4096):
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        assignments[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return assignments
+
+def _spherical_kmeans(sample, nlist, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.flatnonzero(np.bincount(assignments, minlength=nlist) == 0)
+        # Re-seed empty clusters from random points instead of dropping them
+        sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        centroids = _normalize(sums)
+    return centroids
+
+class VectorIndex:
+    def __init__(self, path, dim, nlist=256, nprobe=8):
+        self.path = path
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._lists_cache = None
+        os.makedirs(path, exist_ok=True)
+        if not os.path.exists(self._file('meta.json')):
+            self._write_meta({'dim': dim, 'count': 0, 'nlist': 0, 'trained': False})
+        meta = self._read_meta()
+        if meta['dim'] != dim:
+            raise ValueError(f"Index at {path} has dimension {meta['dim']}, expected {dim}")
+        with db.transaction(self._file('labels.db')) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS labels
+                            (row INTEGER PRIMARY KEY,
+                             key TEXT UNIQUE,
+                             metadata TEXT)''')
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _connect(self):
+        return db.connect(self._file('labels.db'))
+
+    def _read_meta(self):
+        with open(self._file('meta.json')) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        tmp = self._file('meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file('meta.json'))
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        # Serializes writers across threads and, where supported, processes
+        with self._lock, open(self._file('index.lock'), 'w') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def _vectors(self, count):
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self._file('vectors.f32'), dtype=np.float32, mode='r', shape=(count, self.dim))
+
+    def _lists(self, count):
+        return np.memmap(self._file('lists.i32'), dtype=np.int32, mode='r', shape=(count,))
+
+    def __len__(self):
+        return self._read_meta()['count']
+
+    def _append(self, name, data, offset):
+        # Writes at the committed end of the file, dropping whatever an add()
+        # that failed before its meta.json write left behind, so meta['count']
+        # alone decides which rows exist
+        path = self._file(name)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+
+    def _replace(self, name, write):
+        # Readers memory-map these files without the lock: never rewrite in place
+        tmp = self._file(name + '.tmp')
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, self._file(name))
+
+    def add(self, vectors, keys, metadata):
+        vectors = _normalize(vectors)
+        with self._exclusive():
+            meta = self._read_meta()
+            with db.transaction(self._file('labels.db')) as conn:
+                # Labels past the committed count belong to a failed add()
+                conn.execute('DELETE FROM labels WHERE row >= ?', (meta['count'],))
+                known = set()
+                for start in range(0, len(keys), 500):
+                    part = list(keys[start:start + 500])
+                    known.update(row[0] for row in conn.execute(
+                        f'SELECT key FROM labels WHERE key IN ({",".join("?" * len(part))})', part))
+                fresh = []
+                for k, key in enumerate(keys):
+                    if key not in known:
+                        known.add(key)
+                        fresh.append(k)
+                if not fresh:
+                    return 0
+                vectors = vectors[fresh]
+                if meta['trained']:
+                    assignments = _nearest(vectors, np.load(self._file('centroids.npy')))
+                else:
+                    assignments = np.full(len(vectors), -1, dtype=np.int32)
+                self._append('vectors.f32', vectors.tobytes(), meta['count'] * self.dim * 4)
+                self._append('lists.i32', assignments.tobytes(), meta['count'] * 4)
+                conn.executemany('INSERT INTO labels (row, key, metadata) VALUES (?, ?, ?)',
+                                 [(meta['count'] + n, keys[k], json.dumps(metadata[k])) for n, k in enumerate(fresh)])
+            # The rows become visible only here, after the labels committed
+            meta['count'] += len(fresh)
+            self._write_meta(meta)
+        if not meta['trained'] and meta['count'] >= TRAIN_POINTS_PER_LIST * self.nlist:
+            self.train()
+        return len(fresh)
+
+    def train(self, sample_size=None):
+        with self._exclusive():
+            meta = self._read_meta()
+            nlist = min(self.nlist, meta['count'] // TRAIN_POINTS_PER_LIST)
+            if nlist < 2:
+                return False
+            vectors = self._vectors(meta['count'])
+            sample_size = sample_size or 256 * nlist
+            rng = np.random.default_rng(0)
+            rows = np.sort(rng.choice(meta['count'], min(sample_size, meta['count']), replace=False))
+            centroids = _spherical_kmeans(np.asarray(vectors[rows]), nlist)
+            assignments = _nearest(vectors, centroids)
+            self._replace('centroids.npy', lambda f: np.save(f, centroids))
+            self._replace('lists.i32', assignments.tofile)
+            meta.update(nlist=nlist, trained=True)
+            self._write_meta(meta)
+            self._lists_cache = None
+        return True
+
+    def _inverted_lists(self, count, nlist):
+        # Rows grouped by cluster (unassigned rows first); rebuilt only when
+        # the index has grown or been retrained
+        version = (count, os.path.getmtime(self._file('centroids.npy')))
+        cached = self._lists_cache
+        if cached is None or cached[0] != version:
+            lists = np.asarray(self._lists(count))
+            order = np.argsort(lists, kind='stable').astype(np.int64)
+            bounds = np.searchsorted(lists[order], np.arange(-1, nlist + 1))
+            cached = (version, order, bounds)
+            self._lists_cache = cached
+        return cached[1], cached[2]
+
+    def search(self, queries, k=5, nprobe=None, exact=False, exclude_keys=None):
+        queries = _normalize(queries)
+        meta = self._read_meta()
+        count = meta['count']
+        if count == 0:
+            return [[] for _ in queries]
+        vectors = self._vectors(count)
+        if meta['trained'] and not exact:
+            order, bounds = self._inverted_lists(count, meta['nlist'])
+            centroids = np.load(self._file('centroids.npy'))
+            nprobe = min(nprobe or self.nprobe, len(centroids))
+            probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :nprobe]
+            # bounds[0]..bounds[1] holds rows with cluster -1; always scan them
+            unassigned = order[bounds[0]:bounds[1]]
+        fetch = k + len(exclude_keys or ())
+        hits = []
+        for q, query in enumerate(queries):
+            if meta['trained'] and not exact:
+                rows = np.concatenate([unassigned] + [order[bounds[p + 1]:bounds[p + 2]] for p in probes[q]])
+                rows.sort()
+                scores = np.asarray(vectors[rows]) @ query
+            else:
+                rows = np.arange(count)
+                scores = np.concatenate([np.asarray(vectors[s:s + 65536]) @ query for s in range(0, count, 65536)])
+            top = np.argpartition(-scores, min(fetch, len(scores)) - 1)[:fetch] if len(scores) > fetch else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            hits.append([(int(rows[t]), float(scores[t])) for t in top])
+        return self._label(hits, k, exclude_keys)
+
+    def _label(self, hits, k, exclude_keys):
+        wanted = sorted({row for query_hits in hits for row, _ in query_hits})
+        labels = {}
+        conn = self._connect()
+        for start in range(0, len(wanted), 500):
+            part = wanted[start:start + 500]
+            for row, key, metadata in conn.execute(
+                    f'SELECT row, key, metadata FROM labels WHERE row IN ({",".join("?" * len(part))})', part):
+                labels[row] = (key, json.loads(metadata))
+        exclude = set(exclude_keys or ())
+        results = []
+        for query_hits in hits:
+            matches = []
+            for row, score in query_hits:
+                key, metadata = labels[row]
+                if key not in exclude:
+                    matches.append({'key': key, 'score': score, **metadata})
+            results.append(matches[:k])
+        return results